@@ -1,11 +1,14 @@
-import matplotlib.pyplot as plt
+from maze import getOrientation
+
 
 class Astar():
-	def __init__(self, graph, start, goal, viz=False):
+	def __init__(self, graph, start, goal, viz=False, costModel=None, orientation=0):
 		"""	Initialize maze search
 				graph: generated from maze.py 
 				start: tuple starting coordinate
 				goal: tuple goal coordinate
+				costModel: optional TraversalCostModel, weights are then predicted seconds
+				orientation: orientation of the robot at the start, used by costModel
 		"""
 		self.graph = graph 
 		self.start = start 
@@ -13,7 +16,19 @@ class Astar():
 		self.viz = viz
 		self.frontier = [] #priority queue
 		self.came_from = {} #contains previous node
-		self.a_star_search()
+		self.expanded = {} #order nodes were taken off the frontier in
+		self.cost = None #cost of the path found
+		self.costModel = costModel
+		self.orientation = orientation
+		if costModel: #the same for every move in the maze, so look them up
+			self.stepCosts = costModel.getStepCosts()
+			self.heuristicScale = costModel.getMinimumCost()
+		else:
+			self.heuristicScale = 1
+		if costModel: #a turn's cost depends on the way the robot faces, so that is part of the state
+			self.timed_search()
+		else:
+			self.a_star_search()
 
 
 
@@ -21,7 +36,7 @@ class Astar():
 		""" return calculated manhattan distance from node to goal
 				node: node to start from 
 		"""
-		return abs(node[0]-self.goal[0]) + abs(node[1]-self.goal[1])
+		return (abs(node[0]-self.goal[0]) + abs(node[1]-self.goal[1])) * self.heuristicScale
 	
 	def a_star_search(self):
 		""" traverse the maze and check nodes by priority until goal is reached
@@ -34,12 +49,14 @@ class Astar():
 		last = self.start
 		while len(self.frontier): #while there are nodes to check
 			current = self.frontier.pop()[0] #coordinate with highest priority
+			if current not in self.expanded:
+				self.expanded[current] = len(self.expanded)
 			if self.viz:
 				self.visualize(current, cost_so_far)
 
 
 			if current == self.goal: #if we found goal
-				print "cost", cost_so_far[current]
+				self.cost = cost_so_far[current]
 				return #done
 
 			x, y = current
@@ -55,6 +72,51 @@ class Astar():
 
 			
 
+	def timed_search(self):
+		""" traverse (node, orientation) states by priority until the goal is reached
+				gives the quickest path under costModel, since getting to a node facing
+				another way is a different state with its own cost
+		"""
+		start = (self.start, self.orientation)
+		self.addToQueue(start, 0)
+		cost_so_far = {start: 0}
+		state_from = {start: None} #previous state
+		closed = set()
+		costs = {} #node: cost it was first expanded at, for visualize
+		while len(self.frontier):
+			current = self.frontier.pop()[0]
+			if current in closed: #queued again at a lower cost and already expanded
+				continue
+			closed.add(current)
+			node, orientation = current
+			if node not in self.expanded:
+				self.expanded[node] = len(self.expanded)
+				costs[node] = cost_so_far[current]
+				self.came_from[node] = state_from[current][0] if state_from[current] else None
+				if self.viz:
+					self.visualize(node, costs)
+
+			if node == self.goal:
+				self.cost = cost_so_far[current]
+				path = [] #came_from follows the path found, an earlier expansion may have set it otherwise
+				while current:
+					path.append(current[0])
+					current = state_from[current]
+				self.came_from[self.start] = None
+				for last, node in zip(reversed(path), reversed(path[:-1])):
+					self.came_from[node] = last
+				return
+
+			x, y = node
+			for neighbor in self.graph[x][y].neighbors:
+				move = getOrientation(node, neighbor)
+				state = (neighbor, move)
+				newCost = cost_so_far[current] + self.stepCosts[orientation][move]
+				if state not in cost_so_far or newCost < cost_so_far[state]:
+					cost_so_far[state] = newCost
+					state_from[state] = current
+					self.addToQueue(state, -(newCost + self.heuristic(neighbor)))
+
 	def calcWeights(self, node1, node2):
 		"""	return calculated weight moving from node1 to node2
 				introduces penalty for turns
@@ -84,6 +146,7 @@ class Astar():
 	def visualize(self, current, cost_so_far):
 		"""	Plot path and weights on the matplotlib maze plot
 		"""
+		import matplotlib.pyplot as plt #only loaded once plotting is asked for
 		plt.gca().text(current[0], current[1], str(cost_so_far[current]), fontsize=14, color='red')
 		last = self.came_from[current]
 		if last:
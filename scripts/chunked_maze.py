@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+""" A maze with no edges, generated a chunk at a time where it is used
+    the plane of nodes is cut into chunkSize x chunkSize chunks. Each chunk is
+    a maze of its own from generateBitmask, seeded by the global seed and the
+    chunk's coordinates, and every border between two chunks gets doors seeded
+    by the seed and the border, so both chunks open the same ones no matter
+    which is made first. Chunks are kept in a bounded least recently used
+    cache and made again if they are needed after being dropped """
+
+import collections
+import hashlib
+import random
+import numpy as np
+from maze import STEPS, Node, generateBitmask
+
+
+def getSeed(*key):
+  """ returns a seed for random.Random made from integers and strings, the same in every run """
+  return int(hashlib.sha1(','.join(str(k) for k in key).encode()).hexdigest()[:15], 16)
+
+
+class GraphColumn(object):
+  """ column i of ChunkedMaze.graph """
+  def __init__(self, maze, i):
+    self.maze = maze
+    self.i = i
+
+  def __getitem__(self, j):
+    """ returns a Node whose neighbors are read from the chunk it is in """
+    node = Node(self.i, j)
+    node.neighbors = self.maze.getNeighbors((self.i, j))
+    return node
+
+
+class ChunkedMaze(object):
+  """ An unbounded maze, node coordinates can be any integers including negative ones """
+  def __init__(self, seed=0, chunkSize=32, cacheSize=256, doors=1):
+    """ seed: global seed, the same seed always gives the same maze
+        chunkSize: nodes on a side of a chunk
+        cacheSize: most chunks kept in memory
+        doors: paths through each border between two chunks
+    """
+    self.seed = seed
+    self.chunkSize = chunkSize
+    self.cacheSize = cacheSize
+    self.doors = doors
+    self.size = None #no edges, for code that checks Maze.size
+    self.chunks = collections.OrderedDict() #(cx, cy): bitmask, least recently used first
+    self.generated = 0 #chunks made, including ones made again after being dropped
+    self.hits = 0
+    self.graph = self #graph[i][j] like Maze.graph, for Astar and MazeSolver
+
+  def __getitem__(self, i):
+    return GraphColumn(self, i)
+
+  def getDoors(self, axis, cx, cy):
+    """ returns where the paths through a border are, counted along it
+        axis: 'x' for the border between chunks (cx, cy) and (cx + 1, cy),
+          'y' for the one between (cx, cy) and (cx, cy + 1)
+    """
+    rand = random.Random(getSeed(self.seed, axis, cx, cy))
+    return rand.sample(range(self.chunkSize), self.doors)
+
+  def makeChunk(self, cx, cy):
+    """ returns the chunkSize x chunkSize bitmask of chunk (cx, cy), with its doors """
+    n = self.chunkSize
+    bitmask = generateBitmask(n, getSeed(self.seed, 'chunk', cx, cy))
+    for p in self.getDoors('x', cx, cy):
+      bitmask[n - 1, p] |= 2 #+x
+    for p in self.getDoors('x', cx - 1, cy):
+      bitmask[0, p] |= 8 #-x
+    for p in self.getDoors('y', cx, cy):
+      bitmask[p, n - 1] |= 1 #+y
+    for p in self.getDoors('y', cx, cy - 1):
+      bitmask[p, 0] |= 4 #-y
+    return bitmask
+
+  def getChunk(self, cx, cy):
+    """ returns the bitmask of chunk (cx, cy), made now if it is not cached """
+    key = (cx, cy)
+    bitmask = self.chunks.pop(key, None)
+    if bitmask is None:
+      bitmask = self.makeChunk(cx, cy)
+      self.generated += 1
+      if len(self.chunks) >= self.cacheSize:
+        self.chunks.popitem(last=False) #least recently used
+    else:
+      self.hits += 1
+    self.chunks[key] = bitmask #most recently used
+    return bitmask
+
+  def getSignature(self, node):
+    """ returns the 4 bit path signature of a node, as in Maze.getBitmask """
+    n = self.chunkSize
+    (cx, i), (cy, j) = divmod(node[0], n), divmod(node[1], n)
+    return int(self.getChunk(cx, cy)[i, j])
+
+  def getNeighbors(self, node):
+    """ returns the nodes a node has paths to """
+    signature = self.getSignature(node)
+    return [(node[0] + dx, node[1] + dy) for k, (dx, dy) in enumerate(STEPS) if signature & (1 << k)]
+
+  def getWindow(self, corner, size):
+    """ returns a size x size bitmask of the nodes from corner on, paths leaving the window are closed
+        so it can go to Maze.fromBitmask, MazeRaycaster or MazeLocalizer
+        corner: node that becomes [0, 0]
+    """
+    n = self.chunkSize
+    window = np.zeros((size, size), dtype=np.uint8)
+    x0, y0 = corner
+    for cx in range(x0 // n, (x0 + size - 1) // n + 1):
+      for cy in range(y0 // n, (y0 + size - 1) // n + 1):
+        chunk = self.getChunk(cx, cy)
+        i0, j0 = max(cx*n, x0), max(cy*n, y0) #overlap of the chunk and the window
+        i1, j1 = min((cx + 1)*n, x0 + size), min((cy + 1)*n, y0 + size)
+        window[i0 - x0:i1 - x0, j0 - y0:j1 - y0] = chunk[i0 - cx*n:i1 - cx*n, j0 - cy*n:j1 - cy*n]
+    window[:, -1] &= ~1 & 15
+    window[-1, :] &= ~2 & 15
+    window[:, 0] &= ~4 & 15
+    window[0, :] &= ~8 & 15
+    return window
+
+  def getStats(self):
+    """ returns a dict of cache statistics """
+    return {'cached chunks': len(self.chunks),
+            'generated chunks': self.generated,
+            'cache hits': self.hits,
+            'cached bytes': sum(c.nbytes for c in self.chunks.values())}
+
+
+if __name__ == '__main__':
+  import argparse
+  import time
+  from maze_solver import MazeSolver
+  parser = argparse.ArgumentParser(description='solve legs across an unbounded maze and report the chunk cache')
+  parser.add_argument('--legs', type=int, default=10)
+  parser.add_argument('--distance', type=int, default=100, help='nodes between the ends of a leg on each axis')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--chunk-size', type=int, default=32)
+  parser.add_argument('--cache-size', type=int, default=64)
+  args = parser.parse_args()
+
+  maze = ChunkedMaze(args.seed, args.chunk_size, args.cache_size)
+  rand = random.Random(args.seed)
+  start = (0, 0)
+  for leg in range(args.legs):
+    goal = (start[0] + rand.choice([-1, 1])*args.distance, start[1] + rand.choice([-1, 1])*args.distance)
+    t = time.time()
+    solver = MazeSolver(maze=maze, start=start, goal=goal)
+    print('leg %d %s to %s: %d nodes, %.2f s, %s' % (leg, start, goal, len(solver.path), time.time() - t,
+                                                     maze.getStats()))
+    start = goal
+
+  #a chunk made again after being dropped is the same
+  same = (maze.makeChunk(0, 0) == ChunkedMaze(args.seed, args.chunk_size).getChunk(0, 0)).all()
+  print('chunk (0, 0) made again %s' % ('matches' if same else 'differs'))
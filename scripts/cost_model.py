@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+""" Predicts how long the robot takes to drive a path through the maze
+    a straight move costs nodeDistance / linearSpeed and every change of
+    orientation adds the time to turn plus a settle time for stopping before
+    and starting after the turn, which matches how MazeNavigator drives runs """
+
+import math
+import numpy as np
+
+TURNS = [0, math.pi/2, math.pi, math.pi/2] #turn angle by (next - previous orientation) % 4
+
+
+class TraversalCostModel(object):
+  """ Time cost of moving between nodes, orientations as in MazeSolver.getNextOrientation """
+  def __init__(self, nodeDistance=.8, linearSpeed=.4, angularSpeed=.2, settleTime=3.0):
+    """ nodeDistance: distance between nodes
+        linearSpeed: forward speed in meters per second
+        angularSpeed: turning speed in radians per second
+        settleTime: seconds added by every turn for stopping, settling and starting again
+      the defaults were calibrated on MazeNavigator runs in maze_sim
+    """
+    self.nodeDistance = nodeDistance
+    self.linearSpeed = linearSpeed
+    self.angularSpeed = angularSpeed
+    self.settleTime = settleTime
+
+  def getTurnTime(self, turn):
+    """ returns seconds to turn by an angle in radians, 0 for no turn """
+    if turn == 0:
+      return 0.0
+    return abs(turn) / self.angularSpeed + self.settleTime
+
+  def getStepCosts(self):
+    """ returns a 4 x 4 list of seconds to move one node,
+        indexed by orientation before and orientation of the move
+    """
+    straight = self.nodeDistance / self.linearSpeed
+    return [[straight + self.getTurnTime(TURNS[(after - before) % 4]) for after in range(4)]
+            for before in range(4)]
+
+  def getMinimumCost(self):
+    """ returns the cheapest possible move, scales a node count into a heuristic that never overestimates """
+    return self.nodeDistance / self.linearSpeed
+
+  def getPathTime(self, instructions):
+    """ returns predicted seconds to perform a list of instructions
+        instructions: from MazeSolver.getInstructions or MazeSolver.getRuns
+    """
+    straight = self.nodeDistance / self.linearSpeed
+    return sum(self.getTurnTime(i[0]) + straight*(i[3] if len(i) > 3 else 1) for i in instructions)
+
+  def calibrate(self, samples):
+    """ fit the speeds and the settle time to measured runs
+        samples: list of (turn in radians, nodes moved forward, seconds taken)
+        returns the root mean square error of the fit in seconds
+    """
+    samples = np.asarray(samples, dtype=float)
+    turn, nodes, seconds = samples[:, 0], samples[:, 1], samples[:, 2]
+    A = np.column_stack([nodes, np.abs(turn), turn != 0])
+    (perNode, perRadian, settle), _, _, _ = np.linalg.lstsq(A, seconds, rcond=None)
+    if perNode > 0:
+      self.linearSpeed = self.nodeDistance / perNode
+    if perRadian > 0:
+      self.angularSpeed = 1 / perRadian
+    self.settleTime = max(settle, 0.0)
+    predicted = [self.getTurnTime(t) + n*self.nodeDistance/self.linearSpeed for t, n, _ in samples]
+    return float(np.sqrt(np.mean((np.array(predicted) - seconds)**2)))
+
+
+if __name__ == '__main__':
+  import argparse
+  from sensor_log import SensorLog, LogReplay
+  parser = argparse.ArgumentParser(description='fit the cost model to recorded traversals')
+  parser.add_argument('logs', nargs='+', help='sensor logs recorded by MazeNavigator')
+  args = parser.parse_args()
+
+  samples = []
+  for filename in args.logs:
+    replay = LogReplay(SensorLog(filename))
+    replay.run()
+    samples.extend(replay.runs)
+
+  model = TraversalCostModel()
+  error = model.calibrate(samples)
+  print('runs          %d' % len(samples))
+  print('linearSpeed   %.3f' % model.linearSpeed)
+  print('angularSpeed  %.3f' % model.angularSpeed)
+  print('settleTime    %.3f' % model.settleTime)
+  print('rms error     %.3f s' % error)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+""" 8-connected A* on occupancy grids, such as a rasterized maze or a SLAM map
+    straight moves cost 10 and diagonal ones 14 like obsolete/astar_grid.py,
+    with the matching octile heuristic. The grid is padded with a border of
+    occupied cells and flattened, so cells are integers and neighbors are fixed
+    index steps. Instead of popping one node at a time off a heap, every open
+    cell whose f cost is in the current bucket is expanded at once, all 8 moves
+    in one gather, and cells whose cost later improves are simply opened again,
+    so the path found is still a cheapest one. Costs and parents are kept in
+    flat arrays over the whole grid """
+
+import numpy as np
+
+STRAIGHT = 10
+DIAGONAL = 14
+
+
+def getMazeGrid(bitmask):
+  """ returns a (2*size + 1) square bool grid of a maze, True where there is a wall
+      node i, j is cell (2*i + 1, 2*j + 1), orientations as in MazeSolver.getNextOrientation
+      bitmask: 4 bit path signatures from Maze.getBitmask or generateBitmask
+  """
+  bitmask = np.asarray(bitmask, dtype=np.uint8)
+  size = bitmask.shape[0]
+  grid = np.ones((2*size + 1, 2*size + 1), dtype=bool)
+  grid[1::2, 1::2] = False
+  grid[1::2, 2::2] = (bitmask & 1) == 0 #path to +y
+  grid[2::2, 1::2] = (bitmask & 2) == 0 #path to +x
+  return grid
+
+def fromOccupancyGrid(data, width, height, threshold=50, unknownIsFree=False):
+  """ returns a bool grid, True where a nav_msgs/OccupancyGrid is occupied, indexed [row, column]
+      data: occupancy from 0 to 100 in row major order, -1 for unknown
+      threshold: least occupancy that blocks a cell
+      unknownIsFree: plan through unknown cells instead of around them
+  """
+  occupancy = np.asarray(data, dtype=np.int16).reshape(height, width)
+  blocked = occupancy >= threshold
+  if not unknownIsFree:
+    blocked |= occupancy < 0
+  return blocked
+
+
+class GridPlanner(object):
+  """ Shortest 8-connected paths on one occupancy grid, set up once and planned on many times """
+  def __init__(self, grid, cutCorners=False, bucket=4*STRAIGHT):
+    """ grid: 2D array, nonzero where a cell is occupied
+        cutCorners: allow diagonal moves past an occupied cell, which a robot with any width cannot do
+        bucket: range of f costs expanded together, wider buckets take fewer steps
+          but expand more cells that turn out not to be needed
+    """
+    grid = np.asarray(grid) != 0
+    self.shape = grid.shape
+    self.width = W = grid.shape[1] + 2
+    self.bucket = bucket
+    blocked = np.ones((grid.shape[0] + 2, W), dtype=bool)
+    blocked[1:-1, 1:-1] = grid
+    self.blocked = blocked.ravel()
+    self.expanded = 0 #cell expansions made by the last plan
+    self.steps = 0 #frontier expansions made by the last plan
+
+    #bit k of a cell is set when move k can be made from it
+    free = ~self.blocked
+    diagonals = [(a, b) for a in (1, -1) for b in (W, -W)]
+    self.moves = [(step, STRAIGHT) for step in (1, W, -1, -W)] + [(a + b, DIAGONAL) for a, b in diagonals]
+    #moves last to first, the order np.unpackbits gives the bits of allowed in
+    self.steps8 = np.array([step for step, move in self.moves[::-1]], dtype=np.intp) #intp indexes without a conversion
+    self.costs8 = np.array([move for step, move in self.moves[::-1]], dtype=np.int32)
+    sides = [()]*4 + diagonals #cells a move passes between
+    self.allowed = np.zeros(self.blocked.size, dtype=np.uint8)
+    for k, (step, move) in enumerate(self.moves):
+      ok = free & np.roll(free, -step) #the border is blocked, so nothing wraps around
+      if not cutCorners:
+        for side in sides[k]:
+          ok &= np.roll(free, -side)
+      self.allowed |= ok.astype(np.uint8) << k
+
+  def getIndex(self, cell):
+    """ returns the flat index of a (row, column) cell """
+    return (cell[0] + 1)*self.width + cell[1] + 1
+
+  def getHeuristic(self, goal):
+    """ returns the octile distance from every flat cell to the flat goal """
+    rows, columns = self.blocked.size // self.width, self.width
+    gx, gy = divmod(goal, self.width)
+    dx = np.abs(np.arange(rows, dtype=np.int32) - gx)[:, None]
+    dy = np.abs(np.arange(columns, dtype=np.int32) - gy)[None, :]
+    return (STRAIGHT*(dx + dy) + (DIAGONAL - 2*STRAIGHT)*np.minimum(dx, dy)).ravel()
+
+  def plan(self, start, goal):
+    """ returns the cells of a cheapest path from start to goal as a k x 2 array
+        of (row, column), None when there is none
+        start, goal: (row, column) cells
+    """
+    N = self.blocked.size
+    first, target = self.getIndex(start), self.getIndex(goal)
+    if self.blocked[first] or self.blocked[target]:
+      return None
+    infinity = np.iinfo(np.int32).max
+    h = self.getHeuristic(target)
+    cost = np.full(N, infinity, dtype=np.int32)
+    parent = np.empty(N, dtype=np.intp)
+    cost[first] = 0
+    best = infinity #cost of the best path to goal so far
+
+    #open cells and the costs they were opened at, a cell is only opened again at a lower cost,
+    #so a deferred one whose cost changed meanwhile was opened again and is not needed anymore
+    frontier = np.array([first], dtype=np.intp)
+    g = np.zeros(1, dtype=np.int32)
+    deferred = [] #(cells, costs) open beyond the bucket
+    bound = h[first] + self.bucket
+    self.expanded = self.steps = 0
+    while True:
+      f = g + h[frontier]
+      if best < infinity: #only what could still lead to a cheaper path
+        useful = f < best
+        frontier, g, f = frontier[useful], g[useful], f[useful]
+      now = f < bound
+      if not now.all():
+        later = ~now
+        deferred.append((frontier[later], g[later]))
+        frontier, g = frontier[now], g[now]
+
+      if not frontier.size: #bucket done, move on to the next one that has open cells
+        if not deferred:
+          break
+        frontier = np.concatenate([cells for cells, _ in deferred])
+        g = np.concatenate([costs for _, costs in deferred])
+        f = g + h[frontier]
+        now = (g == cost[frontier]) & (f < best)
+        frontier, g, f = frontier[now], g[now], f[now]
+        if not frontier.size:
+          break
+        bound = f.min() + self.bucket
+        deferred = []
+        continue
+
+      self.expanded += frontier.size
+      self.steps += 1
+
+      #all 8 moves of every cell in one gather
+      w = frontier[:, None] + self.steps8
+      c = g[:, None] + self.costs8
+      better = np.unpackbits(self.allowed[frontier][:, None], axis=1).view(bool)
+      better &= c < cost[w]
+      k = np.flatnonzero(better)
+      v, w, c = frontier[k >> 3], w.ravel()[k], c.ravel()[k]
+      cost[w] = c
+      lower = c < cost[w] #a cell reached several ways got an arbitrary one of the costs
+      while lower.any():
+        cost[w[lower]] = c[lower]
+        lower = c < cost[w]
+      won = c == cost[w]
+      v, w, c = v[won], w[won], c[won]
+      parent[w] = v
+      single = parent[w] == v #one of the moves that tie for a cell, a cell moves to each neighbor only once
+      frontier, g = w[single], c[single]
+      best = cost[target]
+
+    if best == infinity:
+      return None
+    path = [target]
+    while path[-1] != first:
+      path.append(parent[path[-1]])
+    rows, columns = np.divmod(np.array(path[::-1]), self.width)
+    return np.column_stack([rows - 1, columns - 1])
+
+  def getCost(self, path):
+    """ returns the cost of a path from plan, 10 per straight and 14 per diagonal move """
+    steps = np.abs(np.diff(path, axis=0)).sum(axis=1)
+    return int(STRAIGHT*np.count_nonzero(steps == 1) + DIAGONAL*np.count_nonzero(steps == 2))
+
+
+if __name__ == '__main__':
+  import argparse
+  import time
+  parser = argparse.ArgumentParser(description='plan across random occupancy grids and time it')
+  parser.add_argument('--size', type=int, default=2000, help='grid cells on a side')
+  parser.add_argument('--density', type=float, default=.2, help='share of randomly occupied cells')
+  parser.add_argument('--maze', type=int, help='plan across a rasterized maze of this many nodes on a side instead')
+  parser.add_argument('--trials', type=int, default=5)
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args()
+
+  rand = np.random.RandomState(args.seed)
+  for trial in range(args.trials):
+    if args.maze:
+      from maze import generateBitmask
+      grid = getMazeGrid(generateBitmask(args.maze, args.seed + trial))
+      start, goal = (1, 1), (grid.shape[0] - 2, grid.shape[1] - 2)
+    else:
+      grid = rand.random_sample((args.size, args.size)) < args.density
+      start, goal = (0, 0), (args.size - 1, args.size - 1)
+      grid[start] = grid[goal] = False
+    t = time.time()
+    planner = GridPlanner(grid)
+    setup = time.time() - t
+    t = time.time()
+    path = planner.plan(start, goal)
+    seconds = time.time() - t
+    print('setup %.3f s, plan %.3f s, expanded %d in %d steps, %s' % (setup, seconds, planner.expanded, planner.steps,
+          'cost %d over %d cells' % (planner.getCost(path), len(path)) if path is not None else 'no path'))
@@ -4,10 +4,12 @@ from geometry_msgs.msg import PoseStamped, Pose, Point, Quaternion
 from nav_msgs.msg import Odometry
 
 # import tf
-from tf import TransformListener
+from tf import TransformListener, LookupException, ConnectivityException, ExtrapolationException
 from tf.transformations import euler_from_quaternion, rotation_matrix, quaternion_from_matrix, quaternion_from_euler
+from tf.transformations import translation_matrix, quaternion_matrix, translation_from_matrix, inverse_matrix
 
 import math
+import threading
 
 
 import numpy as np
@@ -82,6 +84,91 @@ def fix_map_to_odom_transform(self, stamp, coord, orient, listener, broadcaster)
                                   "odom",
                                   "maze_scan")
 
+def map_to_odom_correction(coord, orient, odom_to_base):
+  """ Same fix-up as fix_map_to_odom_transform, computed from a known transform
+      coord: node the robot is at
+      orient: orientation of the robot, one of [0, 1, 2, 3]
+      odom_to_base: (translation, rotation) of base_link in the odom frame
+      returns (translation, rotation) of odom in the maze_scan frame
+  """
+  yaw = math.pi/2 - orient*math.pi/2 #same headings as fix_map_to_odom_transform
+  robot_pose = translation_matrix((coord[0], coord[1], 0)).dot(quaternion_matrix(quaternion_from_euler(0, 0, yaw)))
+  base = translation_matrix(odom_to_base[0]).dot(quaternion_matrix(odom_to_base[1]))
+  odom_to_map = base.dot(inverse_matrix(robot_pose)) #maze origin in the odom frame
+  correction = inverse_matrix(odom_to_map)
+  return translation_from_matrix(correction), quaternion_from_matrix(correction)
+
+class TransformCache(object):
+  """ Keeps the latest odom to base_link transform and broadcasts the
+      map to odom fix-up from a background thread, so callers never wait on tf
+  """
+  def __init__(self, listener, broadcaster, rate=20, wait=.5):
+    """ listener: tf TransformListener
+        broadcaster: tf TransformBroadcaster
+        rate: how often the transform is refreshed and the fix-up rebroadcast, in Hz
+        wait: seconds to keep asking tf for the transform at a request's stamp before making do with the latest
+    """
+    self.listener = listener
+    self.broadcaster = broadcaster
+    self.rate = rate
+    self.wait = wait
+    self.lock = threading.Lock()
+    self.odom_to_base = None #latest (translation, rotation) of base_link in odom
+    self.correction = None #latest (translation, rotation) of odom in maze_scan
+    self.pending = None #(stamp, coord, orient) waiting for a transform
+
+    self.thread = threading.Thread(target=self.run)
+    self.thread.daemon = True
+    self.thread.start()
+
+  def request(self, stamp, coord, orient):
+    """ queue a fix-up for the robot reaching a node, returns immediately
+        stamp: time the node was reached
+        coord: node the robot is at
+        orient: orientation of the robot, one of [0, 1, 2, 3]
+    """
+    with self.lock:
+      self.pending = (stamp, coord, orient)
+
+  def lookup(self, stamp):
+    """ returns the odom to base_link transform at stamp if tf has it, else None """
+    try:
+      return self.listener.lookupTransform("/odom", "/base_link", stamp)
+    except (LookupException, ConnectivityException, ExtrapolationException):
+      return None
+
+  def run(self):
+    """ refresh the cached transform, turn pending requests into a fix-up and broadcast it """
+    r = rospy.Rate(self.rate)
+    while not rospy.is_shutdown():
+      latest = self.lookup(rospy.Time(0))
+      with self.lock:
+        if latest:
+          self.odom_to_base = latest
+        pending = self.pending
+        odom_to_base = self.odom_to_base
+
+      if pending:
+        stamp, coord, orient = pending
+        at_stamp = self.lookup(stamp) #tf usually has not caught up to stamp on the first passes
+        if not at_stamp and rospy.Time.now().to_sec() - stamp.to_sec() > self.wait:
+          at_stamp = odom_to_base #tf is late or has dropped stamp, the latest will do
+        if at_stamp:
+          correction = map_to_odom_correction(coord, orient, at_stamp)
+          with self.lock:
+            self.correction = correction
+            if self.pending is pending: #no newer request came in meanwhile
+              self.pending = None
+
+      if self.correction:
+        translation, rotation = self.correction
+        self.broadcaster.sendTransform(translation,
+                                       rotation,
+                                       rospy.get_rostime(),
+                                       "odom",
+                                       "maze_scan")
+      r.sleep()
+
 def convert_translation_rotation_to_pose(translation, rotation):
   """ Convert from representation of a pose as translation and rotation (Quaternion) tuples to a geometry_msgs/Pose message """
   return Pose(position=Point(x=translation[0],y=translation[1],z=translation[2]), orientation=Quaternion(x=rotation[0],y=rotation[1],z=rotation[2],w=rotation[3]))
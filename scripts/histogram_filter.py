@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+""" Bayes filter over every (orientation, node) state of a maze
+    the belief is a 4 x size x size array. Moving forward shifts each
+    orientation's slice one node along its direction where there is a path,
+    turning rolls the orientation axis, and a scan is weighed against the wall
+    profile the robot would see from each state """
+
+import math
+import numpy as np
+from maze import STEPS, generateBitmask, rotateSignature
+from raycaster import MazeRaycaster
+
+
+def getProfiles(project, beams=360):
+  """ returns a 16 x beams array of the scan seen at a node center for each 4 bit wall signature
+      bit k of a signature is a path k quarter turns clockwise from the robot's front
+      project: MazeNavigator.projectMaze or anything else that takes a getWalls list
+  """
+  profiles = np.zeros((16, beams))
+  for signature in range(16):
+    walls = [1 if signature & (1 << k) else None for k in range(4)]
+    profiles[signature] = np.asarray(project(walls), dtype=float)[:beams]
+  return profiles
+
+def getRaycastProfiles(nodeDistance=.8, wallDistance=.3, maxDistance=.6, beams=360):
+  """ returns the same profiles as getProfiles(MazeNavigator.projectMaze) using MazeRaycaster,
+      for use without the navigator
+  """
+  profiles = np.zeros((16, beams))
+  for signature in range(16):
+    bitmask = np.zeros((3, 3), dtype=np.uint8) #facing +y, so relative and absolute orientations agree
+    bitmask[1, 1] = signature
+    for k, (dx, dy) in enumerate(STEPS):
+      if signature & (1 << k):
+        bitmask[1 + dx, 1 + dy] = 1 << ((k + 2) % 4)
+    caster = MazeRaycaster(bitmask, nodeDistance, wallDistance, maxDistance)
+    profiles[signature] = caster.cast(nodeDistance, nodeDistance, math.pi/2, beams)
+  return profiles
+
+def shift(a, h):
+  """ returns a moved one node along orientation h, whatever falls off the edge is dropped """
+  out = np.zeros_like(a)
+  dx, dy = STEPS[h]
+  if dx:
+    out[max(dx, 0):a.shape[0] + min(dx, 0)] = a[max(-dx, 0):a.shape[0] + min(-dx, 0)]
+  else:
+    out[:, max(dy, 0):a.shape[1] + min(dy, 0)] = a[:, max(-dy, 0):a.shape[1] + min(-dy, 0)]
+  return out
+
+
+class HistogramFilter(object):
+  """ Probability of the robot being at every node facing every orientation """
+  def __init__(self, bitmask, profiles=None, maxDistance=.6, step=5, sigma=.05, outlier=.1,
+               minLikelihood=1e-6):
+    """ bitmask: 4 bit path signatures from Maze.getBitmask or generateBitmask
+        profiles: 16 x beams expected scans from getProfiles, by default from getRaycastProfiles
+        maxDistance: ranges of 0 or beyond this count as nothing seen
+        step: only every step-th beam is compared
+        sigma: standard deviation of a measured range
+        outlier: chance of a beam seeing something that is not a wall, like the human
+        minLikelihood: least weight one scan can give a state relative to the best,
+          keeps a single bad scan from ruling out the truth
+    """
+    self.size = bitmask.shape[0]
+    self.maxDistance = maxDistance
+    self.step = step
+    self.sigma = sigma
+    self.outlier = outlier
+    self.minLikelihood = minLikelihood
+    bitmask = np.asarray(bitmask, dtype=np.uint8)
+
+    if profiles is None:
+      profiles = getRaycastProfiles(maxDistance=maxDistance)
+    self.profiles = self.clip(profiles)
+
+    #paths ahead of each orientation and the signature it sees from each node
+    self.open = np.array([bitmask & (1 << h) > 0 for h in range(4)])
+    self.seen = np.array([rotateSignature(bitmask, h) for h in range(4)], dtype=np.uint8)
+    self.reset()
+
+  def clip(self, ranges):
+    """ returns ranges with nothing seen mapped to maxDistance """
+    r = np.array(ranges, dtype=float)
+    r[~np.isfinite(r) | (r <= 0) | (r > self.maxDistance)] = self.maxDistance
+    return r
+
+  def reset(self):
+    """ the robot could be anywhere """
+    self.belief = np.full((4, self.size, self.size), 1.0 / (4*self.size**2), dtype=np.float32)
+
+  def setPose(self, node, orientation):
+    """ the robot is known to be at node facing orientation """
+    self.belief[:] = 0
+    self.belief[orientation, node[0], node[1]] = 1
+
+  def move(self, pMove=.9, pStay=.05, pDouble=.05):
+    """ the robot drove forward one node
+        pMove, pStay, pDouble: chance it really moved one, zero or two nodes,
+          a move blocked by a wall ends where the wall is
+    """
+    for h in range(4):
+      a = self.belief[h]
+      can = self.open[h]
+      one = shift(a*can, h)
+      blocked = a*~can
+      two = shift(one*can, h)
+      self.belief[h] = pStay*a + pMove*(one + blocked) + pDouble*(two + one*~can + blocked)
+
+  def turn(self, turns, pSlip=.05):
+    """ the robot turned clockwise by a number of quarter turns, 1 is right, 3 is left
+        pSlip: chance of ending a quarter turn short or long, each
+    """
+    b = self.belief
+    self.belief = ((1 - 2*pSlip)*np.roll(b, turns, 0) + pSlip*np.roll(b, turns - 1, 0) +
+                   pSlip*np.roll(b, turns + 1, 0)).astype(np.float32)
+
+  def getSignatureLikelihoods(self, ranges):
+    """ returns how well a scan matches each of the 16 wall profiles, the best is 1 """
+    observed = self.clip(ranges)
+    profiles = self.profiles
+    if observed.size != profiles.shape[1]: #compare beams pointing the same way
+      profiles = profiles[:, (np.arange(observed.size) * profiles.shape[1]) // observed.size]
+    observed, profiles = observed[::self.step], profiles[:, ::self.step]
+
+    error = (observed - profiles) / self.sigma
+    beam = (1 - self.outlier)*np.exp(-.5*error**2) + self.outlier #a robust per beam likelihood
+    logLikelihood = np.log(beam).sum(axis=1)
+    return np.maximum(np.exp(logLikelihood - logLikelihood.max()), self.minLikelihood)
+
+  def observe(self, ranges):
+    """ weigh every state by how well the scan matches the walls it would see
+        ranges: 360 degree scan, beam i pointing i*360/len(ranges) degrees counterclockwise from the front
+    """
+    likelihood = self.getSignatureLikelihoods(ranges).astype(np.float32)
+    self.belief *= likelihood[self.seen]
+    self.belief /= self.belief.sum()
+
+  def getEstimate(self):
+    """ returns ((i, j), orientation, probability) of the most likely state """
+    k = int(np.argmax(self.belief))
+    h, rest = divmod(k, self.size**2)
+    i, j = divmod(rest, self.size)
+    return (i, j), h, float(self.belief[h, i, j])
+
+
+if __name__ == '__main__':
+  import argparse
+  import random
+  import time
+
+  parser = argparse.ArgumentParser(description='track a robot wandering a random maze from an unknown start')
+  parser.add_argument('--size', type=int, default=500)
+  parser.add_argument('--moves', type=int, default=200)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--noise', type=float, default=.02, help='range noise of the simulated scans')
+  args = parser.parse_args()
+
+  bitmask = generateBitmask(args.size, args.seed)
+  start = time.time()
+  f = HistogramFilter(bitmask)
+  print('set up %d states in %.2f s' % (f.belief.size, time.time() - start))
+  caster = MazeRaycaster(bitmask)
+  rand = random.Random(args.seed)
+  noise = np.random.RandomState(args.seed)
+
+  (i, j), h = (rand.randrange(args.size), rand.randrange(args.size)), rand.randrange(4)
+  times = {'observe': [], 'turn': [], 'move': []}
+  found = None
+  for m in range(args.moves):
+    ranges = caster.cast(i*.8, j*.8, math.pi/2 - h*math.pi/2)
+    ranges[ranges > 0] += noise.normal(0, args.noise, (ranges > 0).sum())
+    t = time.time()
+    f.observe(ranges)
+    times['observe'].append(time.time() - t)
+    node, orientation, p = f.getEstimate()
+    if found is None and node == (i, j) and orientation == h and p > .9:
+      found = m
+
+    #wander, preferring to keep going straight; the robot always moves one node
+    walls = [bitmask[i, j] >> ((h + k) % 4) & 1 for k in range(4)]
+    k = 0 if walls[0] and rand.random() < .7 else rand.choice([k for k in range(4) if walls[k]])
+    h = (h + k) % 4
+    i, j = i + STEPS[h][0], j + STEPS[h][1]
+    t = time.time()
+    f.turn(k)
+    times['turn'].append(time.time() - t)
+    t = time.time()
+    f.move()
+    times['move'].append(time.time() - t)
+
+  node, orientation, p = f.getEstimate()
+  print('localized after %s moves, final estimate %s correct with p=%.3f' %
+        (found, 'is' if (node, orientation) == ((i, j), h) else 'is not', p))
+  for name in sorted(times):
+    print('%-8s mean %6.1f ms  max %6.1f ms' % (name, 1000*np.mean(times[name]), 1000*np.max(times[name])))
@@ -0,0 +1,218 @@
+import math
+import numpy as np
+
+
+class Cluster(object):
+  """ A contiguous group of close scan points
+      contains:
+        centroid x and y in the laser frame
+        distance and bearing of the centroid
+        width between the first and last point
+        first and last beam index and number of points
+  """
+  def __init__(self, centroid, width, first, last, count):
+    self.centroid = centroid
+    self.distance = math.sqrt(centroid[0]**2 + centroid[1]**2)
+    self.bearing = math.atan2(centroid[1], centroid[0])
+    self.width = width
+    self.first = first
+    self.last = last
+    self.count = count
+
+
+class HumanDetector(object):
+  """ Splits a laser scan into clusters of nearby points """
+  def __init__(self, threshold=.7, jump=.15, minPoints=1):
+    """ threshold: only points closer than this are considered
+        jump: range change between neighboring beams that starts a new cluster
+        minPoints: clusters with fewer points are dropped as noise
+    """
+    self.threshold = threshold
+    self.jump = jump
+    self.minPoints = minPoints
+    self.angles = {} #cached (cos, sin) beam tables by beam count
+
+  def getAngles(self, beams):
+    """ returns cached (cos, sin) arrays for a scan of evenly spaced beams
+        beam k points 2*pi*k/beams counterclockwise from the laser's front
+    """
+    if beams not in self.angles:
+      angles = np.arange(beams) * (2*math.pi / beams)
+      self.angles[beams] = (np.cos(angles), np.sin(angles))
+    return self.angles[beams]
+
+  def detect(self, ranges, bearing=None, halfWidth=math.pi):
+    """ find every cluster of points closer than threshold
+        ranges: laser scan ranges covering a full circle, 0 where nothing is hit
+        bearing: optional center of the angular window to search
+        halfWidth: half the width of the window in radians
+        returns a list of Cluster objects ordered by their first beam
+    """
+    r = np.asarray(ranges, dtype=float)
+    beams = r.size
+    c, s = self.getAngles(beams)
+
+    index = None #beam numbers when only part of the scan is searched
+    if bearing is not None:
+      center = int(round(bearing / (2*math.pi) * beams))
+      span = int(math.ceil(halfWidth / (2*math.pi) * beams))
+      if 2*span + 1 < beams:
+        index = np.arange(center - span, center + span + 1) % beams
+        r, c, s = r[index], c[index], s[index]
+
+    valid = (r > 0) & (r < self.threshold) #also drops nan and inf
+    if not valid.any():
+      return []
+    x = r * c
+    y = r * s
+
+    #a cluster starts on a valid beam that follows a gap or a jump in range
+    prevValid = np.roll(valid, 1)
+    if index is not None: #a window does not wrap around
+      prevValid[0] = False
+    starts = valid & (~prevValid | (np.abs(r - np.roll(r, 1)) > self.jump))
+    if not starts.any(): #one cluster all the way around
+      starts[0] = True
+
+    #rotate so the scan begins on a cluster start, keeping clusters that wrap past beam 0 whole
+    shift = np.flatnonzero(starts)[0]
+    valid, starts = np.roll(valid, -shift), np.roll(starts, -shift)
+    x, y = np.roll(x, -shift), np.roll(y, -shift)
+
+    labels = np.cumsum(starts)[valid] - 1
+    counts = np.bincount(labels)
+    sumX = np.bincount(labels, weights=x[valid])
+    sumY = np.bincount(labels, weights=y[valid])
+
+    firsts = np.flatnonzero(starts) #clusters are contiguous runs of beams
+    lasts = firsts + counts - 1
+    widths = np.hypot(x[lasts] - x[firsts], y[lasts] - y[firsts])
+
+    firsts = (firsts + shift) % r.size #back to beam numbers
+    lasts = (lasts + shift) % r.size
+    if index is not None:
+      firsts, lasts = index[firsts], index[lasts]
+
+    clusters = []
+    for k in np.flatnonzero(counts >= self.minPoints):
+      centroid = (sumX[k] / counts[k], sumY[k] / counts[k])
+      clusters.append(Cluster(centroid, widths[k], int(firsts[k]), int(lasts[k]), int(counts[k])))
+    return sorted(clusters, key=lambda cluster: cluster.first)
+
+
+class HumanTracker(object):
+  """ Follows the human with a constant velocity Kalman filter in the laser frame
+      the track is carried into the laser frame of each new scan by the odometry
+      change since the last one, so it holds while the robot drives and turns
+      between updates. Only the window around the predicted bearing is searched
+      while the track holds, the whole scan is searched again once it is lost
+  """
+  def __init__(self, detector, window=math.pi/6, gate=.3, maxMisses=3, accelNoise=1.0, rangeNoise=.03):
+    """ detector: HumanDetector used to find clusters
+        window: smallest half width of the search window in radians
+        gate: furthest a cluster may be from the prediction to continue the track
+        maxMisses: scans without a match before the track is lost
+        accelNoise: standard deviation of the human's acceleration
+        rangeNoise: standard deviation of a measured centroid
+    """
+    self.detector = detector
+    self.window = window
+    self.gate = gate
+    self.maxMisses = maxMisses
+    self.accelNoise = accelNoise
+    self.rangeNoise = rangeNoise
+
+    self.state = None #x, y, vx, vy or None without a track
+    self.covariance = None
+    self.stamp = None
+    self.pose = None #odometry x, y, yaw of the robot at the last update
+    self.misses = 0
+    self.fullScans = 0 #scans searched all the way around
+    self.windowScans = 0 #scans searched only around the prediction
+
+  def predict(self, dt):
+    """ move the track forward by dt seconds """
+    F = np.eye(4)
+    F[0, 2] = F[1, 3] = dt
+    q = self.accelNoise**2
+    Q = np.zeros((4, 4))
+    Q[[0, 1], [0, 1]] = q * dt**3 / 3
+    Q[[0, 1, 2, 3], [2, 3, 0, 1]] = q * dt**2 / 2
+    Q[[2, 3], [2, 3]] = q * dt
+    self.state = F.dot(self.state)
+    self.covariance = F.dot(self.covariance).dot(F.T) + Q
+
+  def move(self, pose):
+    """ carry the track into the laser frame at a new robot pose, the laser sits at the
+        robot's center facing forward
+        pose: odometry x, y, yaw of the robot
+    """
+    x, y, yaw = self.pose
+    c, s = math.cos(yaw - pose[2]), math.sin(yaw - pose[2])
+    R = np.array([[c, -s], [s, c]]) #old laser frame to new
+    back = np.array([math.cos(pose[2]), math.sin(pose[2])])
+    dx, dy = x - pose[0], y - pose[1]
+    offset = np.array([back[0]*dx + back[1]*dy, -back[1]*dx + back[0]*dy]) #old laser position in the new frame
+    T = np.zeros((4, 4))
+    T[:2, :2] = T[2:, 2:] = R
+    self.state = T.dot(self.state)
+    self.state[:2] += offset
+    self.covariance = T.dot(self.covariance).dot(T.T)
+
+  def correct(self, centroid):
+    """ fold a measured centroid into the track """
+    H = np.eye(2, 4)
+    R = np.eye(2) * self.rangeNoise**2
+    innovation = np.asarray(centroid) - H.dot(self.state)
+    S = H.dot(self.covariance).dot(H.T) + R
+    K = self.covariance.dot(H.T).dot(np.linalg.inv(S))
+    self.state = self.state + K.dot(innovation)
+    self.covariance = (np.eye(4) - K.dot(H)).dot(self.covariance)
+
+  def start(self, cluster):
+    """ begin a new track at a cluster """
+    self.state = np.array([cluster.centroid[0], cluster.centroid[1], 0.0, 0.0])
+    self.covariance = np.diag([self.rangeNoise**2, self.rangeNoise**2, 1.0, 1.0])
+    self.misses = 0
+
+  def update(self, ranges, stamp, pose=None):
+    """ look for the human in a new scan
+        ranges: laser scan ranges covering a full circle
+        stamp: time of the scan in seconds
+        pose: odometry x, y, yaw of the robot when the scan was taken, None if the robot has not moved
+        returns the Cluster matched to the track, or None if the human was not seen
+    """
+    dt = stamp - self.stamp if self.stamp is not None else 0.0
+    self.stamp = stamp
+    if self.state is not None and self.pose and pose:
+      self.move(pose)
+    self.pose = pose or self.pose
+
+    if self.state is not None:
+      self.predict(max(dt, 0.0))
+      x, y = self.state[:2]
+      distance = math.sqrt(x**2 + y**2)
+      spread = 3*math.sqrt(self.covariance[0, 0] + self.covariance[1, 1])
+      halfWidth = self.window + math.atan2(spread, max(distance, 1e-3)) #widen while unsure
+
+      self.windowScans += 1
+      clusters = self.detector.detect(ranges, math.atan2(y, x), halfWidth)
+      errors = [math.hypot(cl.centroid[0] - x, cl.centroid[1] - y) for cl in clusters]
+      if errors and min(errors) < self.gate:
+        cluster = clusters[errors.index(min(errors))]
+        self.correct(cluster.centroid)
+        self.misses = 0
+        return cluster
+
+      self.misses += 1
+      if self.misses <= self.maxMisses:
+        return None #coast on the prediction
+      self.state = None #lost the track
+
+    self.fullScans += 1
+    clusters = self.detector.detect(ranges)
+    if not clusters:
+      return None
+    cluster = min(clusters, key=lambda cl: cl.distance) #the closest object is the human
+    self.start(cluster)
+    return cluster
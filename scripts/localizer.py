@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+""" Finds the robot's node and orientation in a known maze from the walls it sees
+    every (node, orientation) state is one bit of a bitset held in a Python
+    integer, state k is orientation k // n on node k % n with node i, j at
+    i*size + j. Each 4 bit wall signature seen from the robot indexes the set of
+    states that would see it, so an observation is an AND, moving forward is a
+    shift and turning is a rotation of the orientation blocks """
+
+import binascii
+import numpy as np
+from maze import STEPS, generateBitmask, rotateSignature
+
+
+def toBitset(mask):
+  """ returns the integer whose bit k is mask[k] """
+  mask = np.asarray(mask, dtype=bool)[::-1]
+  padded = np.concatenate([np.zeros(-mask.size % 8, dtype=bool), mask])
+  data = np.packbits(padded).tobytes()
+  return int(binascii.hexlify(data), 16) if data else 0
+
+def fromBitset(bits, length):
+  """ returns a bool array of the lowest length bits of an integer """
+  count = (length + 7) // 8
+  data = binascii.unhexlify('%0*x' % (2*count, bits & ((1 << length) - 1)))
+  return np.unpackbits(np.frombuffer(data, dtype=np.uint8))[::-1][:length].astype(bool)
+
+def countBits(bits):
+  return bin(bits).count('1')
+
+def getSignature(walls):
+  """ returns the 4 bit signature of a MazeNavigator.getWalls list
+      walls: entry k is truthy where there is a path k quarter turns clockwise from the robot's front
+  """
+  return sum(1 << k for k in range(4) if walls[k])
+
+def getScanSignature(ranges, wallDistance=.3, margin=.1, spread=10):
+  """ returns the 4 bit signature of the walls around the robot in a 360 beam scan
+      a direction is a path when its beams see nothing closer than wallDistance + margin
+      ranges: scan with beam i pointing i degrees counterclockwise from the front
+      spread: beams on each side of a direction that are looked at
+  """
+  r = np.asarray(ranges, dtype=float)
+  beams = r.size
+  signature = 0
+  for k in range(4): #front, right, back, left
+    center = int(round(-k * beams / 4.0)) % beams
+    window = r[np.arange(center - spread, center + spread + 1) % beams]
+    hits = window[(window > 0) & np.isfinite(window)]
+    if not hits.size or np.median(hits) > wallDistance + margin:
+      signature |= 1 << k
+  return signature
+
+
+class MazeLocalizer(object):
+  """ Keeps the set of states consistent with everything observed since reset """
+  def __init__(self, bitmask):
+    """ bitmask: 4 bit path signatures from Maze.getBitmask or generateBitmask """
+    self.size = bitmask.shape[0]
+    self.nodes = self.size**2
+    self.states = 4*self.nodes
+    self.all = (1 << self.states) - 1
+    flat = np.asarray(bitmask, dtype=np.uint8).ravel()
+
+    #signature seen facing orientation h, rotated like getWalls
+    seen = np.empty((4, self.nodes), dtype=np.uint8)
+    for h in range(4):
+      seen[h] = rotateSignature(flat, h)
+    self.index = [toBitset(seen.ravel() == signature) for signature in range(16)]
+
+    #states that can move forward, and how far each orientation block shifts
+    self.forward = [toBitset(np.concatenate([np.zeros(h*self.nodes, dtype=bool), flat & (1 << h) > 0,
+                                             np.zeros((3 - h)*self.nodes, dtype=bool)])) for h in range(4)]
+    self.shifts = [dx*self.size + dy for dx, dy in STEPS]
+    self.reset()
+
+  def reset(self):
+    """ forget everything, the robot could be anywhere (e.g. after a kidnapping) """
+    self.candidates = self.all
+
+  def observe(self, signature):
+    """ keep the states that see the walls the robot sees
+        signature: from getSignature or getScanSignature
+    """
+    self.candidates &= self.index[signature]
+
+  def turn(self, turns):
+    """ the robot turned clockwise by a number of quarter turns, as from 1 = right, 2 = full, 3 = left """
+    turns %= 4
+    if turns:
+      shift = turns*self.nodes
+      c = self.candidates
+      self.candidates = ((c << shift) | (c >> (self.states - shift))) & self.all
+
+  def move(self):
+    """ the robot moved forward one node """
+    moved = 0
+    for h in range(4):
+      block = self.candidates & self.forward[h]
+      moved |= block << self.shifts[h] if self.shifts[h] > 0 else block >> -self.shifts[h]
+    self.candidates = moved
+
+  def count(self):
+    """ returns the number of states still possible """
+    return countBits(self.candidates)
+
+  def getCandidates(self, limit=None):
+    """ returns up to limit possible states as ((i, j), orientation) """
+    states = np.flatnonzero(fromBitset(self.candidates, self.states))[:limit]
+    return [(divmod(int(k % self.nodes), self.size), int(k // self.nodes)) for k in states]
+
+  def getPose(self):
+    """ returns ((i, j), orientation) once only one state is left, otherwise None """
+    c = self.candidates
+    if c and not c & (c - 1):
+      k = c.bit_length() - 1
+      return divmod(k % self.nodes, self.size), k // self.nodes
+    return None
+
+
+if __name__ == '__main__':
+  import argparse
+  import random
+  import time
+
+  parser = argparse.ArgumentParser(description='relocalize after kidnappings in a random maze')
+  parser.add_argument('--size', type=int, default=1000)
+  parser.add_argument('--trials', type=int, default=20)
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args()
+
+  start = time.time()
+  bitmask = generateBitmask(args.size, args.seed)
+  print('generated %dx%d maze in %.2f s' % (args.size, args.size, time.time() - start))
+  start = time.time()
+  localizer = MazeLocalizer(bitmask)
+  print('indexed %d states in %.2f s' % (localizer.states, time.time() - start))
+
+  rand = random.Random(args.seed)
+  moves, updates = [], []
+  for trial in range(args.trials):
+    (i, j), h = (rand.randrange(args.size), rand.randrange(args.size)), rand.randrange(4) #kidnapped
+    localizer.reset()
+    steps = 0
+    while True:
+      walls = [bitmask[i, j] >> ((h + k) % 4) & 1 for k in range(4)]
+      t = time.time()
+      localizer.observe(getSignature(walls))
+      updates.append(time.time() - t)
+      pose = localizer.getPose()
+      if pose:
+        assert pose == ((i, j), h)
+        break
+      #wander, preferring to keep going straight
+      k = 0 if walls[0] and rand.random() < .7 else rand.choice([k for k in range(4) if walls[k]])
+      h = (h + k) % 4
+      i, j = i + STEPS[h][0], j + STEPS[h][1]
+      t = time.time()
+      localizer.turn(k)
+      localizer.move()
+      updates.append(time.time() - t)
+      steps += 1
+    moves.append(steps)
+  print('moves to relocalize: mean %.1f, max %d' % (np.mean(moves), max(moves)))
+  print('update time: mean %.2f ms, max %.2f ms' % (1000*np.mean(updates), 1000*max(updates)))
@@ -1,8 +1,9 @@
 import numpy as np
 import random
-from matplotlib import patches, pyplot as plt
 import time
 
+STEPS = [(0, 1), (1, 0), (0, -1), (-1, 0)] #node step of each orientation, 0 is +y, 1 is +x, 2 is -y, 3 is -x
+
 
 class Node(object):
   """ A node in the graph
@@ -25,12 +26,32 @@ class Maze(object):
     self.viz = viz
     self.size = size
     self.show = True
+    self.renderer = None #draws the maze for visualize
     self.graph = [[0 for x in range(self.size)] for x in range(self.size)]
     self.stack = [(0,0)]
     self.recursiveBacktracking((0, 0))
     self.addEdges()
     
 
+  @classmethod
+  def fromBitmask(cls, bitmask, viz=False):
+    """ builds a Maze from 4 bit path signatures instead of generating a new one
+        bitmask: from getBitmask, generateBitmask or a MazeStore
+        viz: optional parameter to visualize the maze
+    """
+    m = cls.__new__(cls)
+    m.viz = viz
+    m.size = bitmask.shape[0]
+    m.show = True
+    m.renderer = None
+    m.stack = []
+    m.graph = [[Node(i, j) for j in range(m.size)] for i in range(m.size)]
+    for i in range(m.size):
+      for j in range(m.size):
+        m.graph[i][j].neighbors = [(i + dx, j + dy) for orient, (dx, dy) in enumerate(STEPS)
+                                   if bitmask[i, j] & (1 << orient)]
+    return m
+
   def getUnvisitedNodes(self, i, j):
     """ returns choices of neighboring nodes 
         that have not been visited by recursiveBacktracking 
@@ -93,7 +114,7 @@ class Maze(object):
         newI, newJ = self.stack.pop() #highest priority in the stack
         self.updateNeighbors((newI, newJ), (i, j))
         if self.viz:
-          self.visualize()
+          self.visualize(((newI, newJ), (i, j)))
         self.recursiveBacktracking((newI, newJ))
       #else we have hit every node in the maze
 
@@ -125,43 +146,91 @@ class Maze(object):
         self.updateNeighbors((x, y), available[0])
         counter +=1
         if self.viz:
-          self.visualize()
+          self.visualize(((x, y), available[0]))
       if counter >= self.size - 2: #add size - 2 edges
         break
 
-  def visualize(self):
-    """ Plot the maze using matplotlib as it is generated
-        Shows a plot
+  def getBitmask(self):
+    """ returns a size x size numpy array of 4 bit path signatures
+        bit k of entry [i][j] is set when node i, j has a path in orientation k
+        orientations match MazeSolver.getNextOrientation:
+          0 is +y, 1 is +x, 2 is -y, 3 is -x
     """
-    plt.clf()
-    #plot maze
+    bitmask = np.zeros((self.size, self.size), dtype=np.uint8)
     for i in range(self.size):
       for j in range(self.size):
-        if self.graph[i][j]:
-          for n in self.graph[i][j].neighbors:
-            pd = 0.35
-            #vertical up from (i/n[0],j)
-            if i==n[0] and j < n[1]:
-              rectangle = patches.Rectangle((i-pd, j-pd), 2*pd, 1 + 2*pd, linewidth=0, fc ='w')
-            #vertical up from (i/n[0], n[1])
-            if i==n[0] and j > n[1]:
-              rectangle = patches.Rectangle((i-pd, n[1]-pd), 2*pd, 1 + 2*pd, linewidth=0, fc ='w')
-            #horizontal (i,j/n[1])
-            if j==n[1] and i < n[0]:
-              rectangle = patches.Rectangle((i-pd , j-pd), 1 + 2*pd, 2*pd, linewidth=0, fc ='w')
-            #horizontal (n[0],j/n[1])
-            if j==n[1] and i > n[0]:
-              rectangle = patches.Rectangle((n[0]-pd, j-pd), 1 + 2*pd, 2*pd, linewidth=0, fc ='w')
-            plt.gca().add_patch(rectangle)
-
-
-    plt.axis([-1, self.size, -1, self.size])
-    plt.gca().set_axis_bgcolor('black')
-    plt.show(False)
+        for x, y in self.graph[i][j].neighbors:
+          if (x, y) == (i, j): #backtracking links the start node to itself
+            continue
+          bitmask[i, j] |= 1 << getOrientation((i, j), (x, y))
+    return bitmask
+
+  def visualize(self, edge=None):
+    """ Plot the maze using matplotlib as it is generated
+        edge: pair of node coordinates that were just connected,
+          only that edge is redrawn, the whole maze is drawn when None
+        Shows a plot
+    """
+    from maze_renderer import MazeRenderer #only loaded once plotting is asked for
+    if self.renderer is None or edge is None:
+      self.renderer = MazeRenderer(self.getBitmask() if edge is None else np.zeros((self.size, self.size), np.uint8))
+    if edge:
+      self.renderer.connect(*edge)
+    self.renderer.update()
     if self.show:
       time.sleep(3)
       self.show = False
-    plt.pause(0.01)
+
+
+def getOrientation(node, nextNode):
+  """ returns the orientation of the move from node to a neighboring nextNode, one of [0, 1, 2, 3] """
+  if node[0] == nextNode[0]:
+    return 0 if nextNode[1] > node[1] else 2
+  return 1 if nextNode[0] > node[0] else 3
+
+def rotateSignature(signature, h):
+  """ returns a 4 bit path signature as seen facing orientation h, rotated like MazeNavigator.getWalls
+      signature: int or uint8 numpy array of signatures
+  """
+  return ((signature >> h) | (signature << (4 - h))) & 15
+
+def generateBitmask(size, seed=None):
+  """ builds a maze the way Maze does, backtracking and then size - 2 extra
+      connections, but without recursion or Node objects so it scales to
+      millions of nodes
+      size: square length of the maze
+      seed: optional seed for the random choices
+      returns a size x size numpy array of 4 bit path signatures like Maze.getBitmask
+  """
+  rand = random.Random(seed)
+  bitmask = bytearray(size*size) #flat index i*size + j
+  visited = bytearray(size*size)
+  stack = [(0, 0)]
+  visited[0] = 1
+  while stack:
+    i, j = stack[-1]
+    choices = [(i + dx, j + dy, orient) for orient, (dx, dy) in enumerate(STEPS)
+               if 0 <= i + dx < size and 0 <= j + dy < size and not visited[(i + dx)*size + j + dy]]
+    if choices: #carve into a random unvisited neighbor
+      x, y, orient = rand.choice(choices)
+      bitmask[i*size + j] |= 1 << orient
+      bitmask[x*size + y] |= 1 << ((orient + 2) % 4)
+      visited[x*size + y] = 1
+      stack.append((x, y))
+    else: #blocked in, back up
+      stack.pop()
+
+  counter = 0
+  while counter < size - 2: #extra connections so there is more than one path
+    i, j = rand.randint(0, size - 1), rand.randint(0, size - 1)
+    choices = [(i + dx, j + dy, orient) for orient, (dx, dy) in enumerate(STEPS)
+               if 0 <= i + dx < size and 0 <= j + dy < size and not bitmask[i*size + j] & (1 << orient)]
+    if choices:
+      x, y, orient = rand.choice(choices)
+      bitmask[i*size + j] |= 1 << orient
+      bitmask[x*size + y] |= 1 << ((orient + 2) % 4)
+      counter += 1
+  return np.frombuffer(bytes(bitmask), dtype=np.uint8).reshape(size, size).copy()
 
 if __name__ == "__main__":
   m = Maze(22, viz=True)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+""" Measures how hard a maze is, in time linear in its number of nodes
+    works on the bitmask of Maze.getBitmask or generateBitmask with node i, j
+    at i*size + j of the flattened array. Per node counts are vectorized, the
+    searches walk each node once over plain lists so a million node maze takes
+    seconds. The diameter comes from two breadth first searches, which is exact
+    for perfect mazes (trees) and only a lower bound once paths make loops, as
+    they do in every maze of Maze and generateBitmask """
+
+import json
+import os
+import numpy as np
+from maze import STEPS, generateBitmask
+
+DEGREES = np.array([bin(signature).count('1') for signature in range(16)], dtype=np.uint8)
+#orientations with a path for each signature
+OPEN = [[h for h in range(4) if signature & (1 << h)] for signature in range(16)]
+#way out of a degree 2 node for each signature and orientation of the move that came in
+OTHER = [[([h for h in OPEN[signature] if h != (came + 2) % 4] + [None])[0] for came in range(4)]
+         for signature in range(16)]
+
+
+def getOffsets(size):
+  """ returns the flat index step of each orientation """
+  return [dx*size + dy for dx, dy in STEPS]
+
+def breadthFirst(bitmask, start):
+  """ search out from start
+      returns flat arrays of the moves from start to each node, -1 where it cannot
+      be reached, and of the node each was first reached from, -1 for none
+  """
+  size = bitmask.shape[0]
+  signatures = bitmask.ravel().tolist()
+  offsets = getOffsets(size)
+  moves = [[offsets[h] for h in OPEN[signature]] for signature in range(16)]
+  distance = [-1]*size**2
+  parent = [-1]*size**2
+  first = start[0]*size + start[1]
+  distance[first] = 0
+  queue = [first]
+  for v in queue: #the list grows while it is walked, a queue without the pops
+    d = distance[v] + 1
+    for step in moves[signatures[v]]:
+      w = v + step
+      if distance[w] < 0:
+        distance[w] = d
+        parent[w] = v
+        queue.append(w)
+  return np.array(distance, dtype=np.int64), np.array(parent, dtype=np.int64)
+
+def getCorridorLengths(bitmask):
+  """ returns the length in moves of every corridor, a path between two nodes
+      that are not degree 2 through nodes that all are
+  """
+  size = bitmask.shape[0]
+  signatures = bitmask.ravel().tolist()
+  degrees = DEGREES[bitmask].ravel()
+  offsets = getOffsets(size)
+  passing = (degrees == 2).tolist()
+  visited = bytearray(size**2)
+  lengths = []
+  for u in np.flatnonzero(degrees != 2).tolist():
+    for h in OPEN[signatures[u]]:
+      v = u + offsets[h]
+      length = 1
+      if passing[v]:
+        if visited[v]: #walked from the other end
+          continue
+        while passing[v]:
+          visited[v] = 1
+          h = OTHER[signatures[v]][h]
+          v += offsets[h]
+          length += 1
+      elif v < u: #two junctions next to each other, counted from the first
+        continue
+      lengths.append(length)
+  return np.array(lengths, dtype=np.int64)
+
+def getPath(parent, start, goal, size):
+  """ returns the flat nodes from start to goal following parent from breadthFirst, None if not reached """
+  first, v = start[0]*size + start[1], goal[0]*size + goal[1]
+  path = [v]
+  while v != first:
+    v = int(parent[v])
+    if v < 0:
+      return None
+    path.append(v)
+  return np.array(path[::-1], dtype=np.int64)
+
+def countTurns(path):
+  """ returns the number of changes of orientation along a flat path """
+  steps = np.diff(path)
+  return int(np.count_nonzero(steps[1:] != steps[:-1]))
+
+def analyze(bitmask, start=(0, 0), goal=None):
+  """ returns a dict of difficulty measures of a maze
+      bitmask: 4 bit path signatures from Maze.getBitmask or generateBitmask
+      start: node the solution starts from, the searches only see its part of the maze
+      goal: node the solution ends at, the far corner by default
+  """
+  bitmask = np.asarray(bitmask, dtype=np.uint8)
+  size = bitmask.shape[0]
+  if goal is None:
+    goal = (size - 1, size - 1)
+  degrees = DEGREES[bitmask]
+  corridors = getCorridorLengths(bitmask)
+
+  distance, parent = breadthFirst(bitmask, start)
+  path = getPath(parent, start, goal, size)
+  a = int(np.argmax(distance)) #farthest from start, an end of a longest path in a tree
+  farthest, _ = breadthFirst(bitmask, divmod(a, size))
+  b = int(np.argmax(farthest))
+
+  return {'size': size,
+          'start': list(start),
+          'goal': list(goal),
+          'reachable': int(np.count_nonzero(distance >= 0)),
+          'dead ends': int(np.count_nonzero(degrees == 1)),
+          'degree histogram': np.bincount(degrees.ravel(), minlength=5).tolist(),
+          'corridors': int(corridors.size),
+          'corridor length mean': float(corridors.mean()) if corridors.size else 0.0,
+          'corridor length max': int(corridors.max()) if corridors.size else 0,
+          'corridor length histogram': np.bincount(corridors).tolist(),
+          'diameter lower bound': int(farthest[b]), #exact only without loops
+          'diameter lower bound ends': [list(divmod(a, size)), list(divmod(b, size))],
+          'solution length': int(distance[path[-1]]) if path is not None else None,
+          'solution turns': countTurns(path) if path is not None else None}
+
+def getResultsPath(filename):
+  """ returns the file the results for a maze file are written to, next to it """
+  return os.path.splitext(filename)[0] + '.analytics.json'
+
+
+if __name__ == '__main__':
+  import argparse
+  import time
+  parser = argparse.ArgumentParser(description='measure a maze and write the results next to it')
+  parser.add_argument('maze', help='.npy bitmask as from Maze.getBitmask')
+  parser.add_argument('--size', type=int, help='generate a maze of this size and save it to the file first')
+  parser.add_argument('--seed', type=int, default=0, help='seed of a generated maze')
+  parser.add_argument('--start', type=int, nargs=2, default=(0, 0))
+  parser.add_argument('--goal', type=int, nargs=2)
+  args = parser.parse_args()
+
+  if args.size:
+    np.save(args.maze, generateBitmask(args.size, args.seed))
+  bitmask = np.load(args.maze)
+  t = time.time()
+  results = analyze(bitmask, tuple(args.start), tuple(args.goal) if args.goal else None)
+  results['seconds'] = time.time() - t
+  with open(getResultsPath(args.maze), 'w') as f:
+    json.dump(results, f, indent=1, sort_keys=True)
+  for key in sorted(results):
+    if key != 'corridor length histogram':
+      print('%-22s %s' % (key, results[key]))
+  print('written to %s' % getResultsPath(args.maze))
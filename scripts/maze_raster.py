@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+""" Renders mazes, solutions and A* expansion heatmaps straight into NumPy images
+    every node is a scale x scale block of pixels, images are built by looking
+    up one block per node from its 4 bit path signature, so no plotting library
+    is needed and big mazes can be written out a tile at a time """
+
+import os
+import struct
+import zlib
+import numpy as np
+
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+RED = (255, 0, 0)
+GREEN = (0, 160, 0)
+COOL = (70, 130, 230) #heatmap color of the lowest value
+WARM = (250, 200, 40) #heatmap color of the highest value
+
+
+def getTiles(scale, width, center=True):
+  """ returns a 16 x scale x scale array of blocks, one per 4 bit path signature
+      rows are y and columns are x, both increasing
+      scale: pixels per node
+      width: half width of the paths, in nodes
+      center: whether signature 0 still fills the node center
+  """
+  c = (np.arange(scale) + .5) / scale - .5 #pixel centers from the node center
+  across = np.abs(c) <= width
+  if not across.any(): #at least one pixel wide
+    across[scale // 2] = True
+  up = across | (c > 0)
+  down = across | (c < 0)
+  tiles = np.zeros((16, scale, scale), dtype=bool)
+  for signature in range(16):
+    tile = tiles[signature]
+    if signature or center:
+      tile[np.ix_(across, across)] = True
+    if signature & 1: #+y
+      tile[np.ix_(up, across)] = True
+    if signature & 2: #+x
+      tile[np.ix_(across, up)] = True
+    if signature & 4: #-y
+      tile[np.ix_(down, across)] = True
+    if signature & 8: #-x
+      tile[np.ix_(across, down)] = True
+  return tiles
+
+def tileImage(tiles, signatures):
+  """ returns the image of a [x, y] array of signatures, rows are y and columns are x, both increasing """
+  w, h = signatures.shape
+  scale = tiles.shape[1]
+  return tiles[signatures].transpose(1, 2, 0, 3).reshape(h*scale, w*scale)
+
+def getPathmask(path, size):
+  """ returns a size x size array of 4 bit signatures of the steps along a path,
+      like Maze.getBitmask but only for the path
+      path: list of node coordinates, as from MazeSolver.getPath
+  """
+  pathmask = np.zeros((size, size), dtype=np.uint8)
+  p = np.asarray(path, dtype=int).reshape(-1, 2)
+  if len(p) > 1:
+    d = p[1:] - p[:-1]
+    orient = np.where(d[:, 0] == 0, np.where(d[:, 1] > 0, 0, 2), np.where(d[:, 0] > 0, 1, 3))
+    np.bitwise_or.at(pathmask, (p[:-1, 0], p[:-1, 1]), (1 << orient).astype(np.uint8))
+    np.bitwise_or.at(pathmask, (p[1:, 0], p[1:, 1]), (1 << ((orient + 2) % 4)).astype(np.uint8))
+  return pathmask
+
+def getExpansionMap(expanded, size):
+  """ returns a size x size float array with the order A* expanded each node in, nan if it never was
+      expanded: dict of node coordinates to expansion order, as in Astar.expanded
+  """
+  heat = np.full((size, size), np.nan)
+  if expanded:
+    nodes = np.array(list(expanded.keys()), dtype=int)
+    heat[nodes[:, 0], nodes[:, 1]] = list(expanded.values())
+  return heat
+
+def writePng(filename, image):
+  """ write an 8 bit gray (rows x columns) or RGB (rows x columns x 3) image as a PNG """
+  image = np.ascontiguousarray(image, dtype=np.uint8)
+  h, w = image.shape[:2]
+  colorType = 2 if image.ndim == 3 else 0
+  rows = image.reshape(h, -1)
+  raw = np.hstack([np.zeros((h, 1), dtype=np.uint8), rows]) #filter type 0 on every row
+
+  def chunk(kind, data):
+    return (struct.pack('>I', len(data)) + kind + data +
+            struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+  with open(filename, 'wb') as f:
+    f.write(b'\x89PNG\r\n\x1a\n')
+    f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 8, colorType, 0, 0, 0)))
+    f.write(chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)))
+    f.write(chunk(b'IEND', b''))
+
+
+class MazeRaster(object):
+  """ Draws a maze and optionally its solution and an A* heatmap into RGB images
+      images have +y up: row 0 is the top of the maze, column 0 its left side
+  """
+  def __init__(self, bitmask, path=None, start=None, goal=None, heatmap=None, scale=8, pathWidth=.35):
+    """ bitmask: 4 bit path signatures from Maze.getBitmask
+        path: optional solution, list of node coordinates
+        start, goal: optional nodes to mark, default to the ends of the path
+        heatmap: optional size x size float array, nan where there is nothing to color
+        scale: pixels per node
+        pathWidth: half width of the maze paths, in nodes
+    """
+    self.bitmask = np.asarray(bitmask, dtype=np.uint8)
+    self.size = self.bitmask.shape[0]
+    self.scale = scale
+    self.wallTiles = getTiles(scale, pathWidth, center=False)
+    self.pathTiles = getTiles(scale, pathWidth / 4)
+    self.markTiles = getTiles(scale, pathWidth * .7)[:1] #just the center
+
+    self.pathmask = None
+    self.onPath = None
+    if path is not None and len(path):
+      self.pathmask = getPathmask(path, self.size)
+      self.onPath = np.zeros((self.size, self.size), dtype=bool)
+      p = np.asarray(path, dtype=int).reshape(-1, 2)
+      self.onPath[p[:, 0], p[:, 1]] = True
+      start = tuple(p[0]) if start is None else start
+      goal = tuple(p[-1]) if goal is None else goal
+    self.start = start
+    self.goal = goal
+
+    self.heat = None
+    if heatmap is not None: #scaled to 0..1 once, so tiles share one color scale
+      heat = np.asarray(heatmap, dtype=float)
+      low, high = np.nanmin(heat), np.nanmax(heat)
+      self.heat = (heat - low) / (high - low) if high > low else np.where(np.isnan(heat), heat, 0)
+
+  def render(self, x0=0, y0=0, x1=None, y1=None):
+    """ returns the RGB image of the nodes x0 <= x < x1, y0 <= y < y1, the whole maze by default """
+    x1 = self.size if x1 is None else min(x1, self.size)
+    y1 = self.size if y1 is None else min(y1, self.size)
+    window = (slice(x0, x1), slice(y0, y1))
+
+    free = tileImage(self.wallTiles, self.bitmask[window])
+    image = np.zeros(free.shape + (3,), dtype=np.uint8)
+    image[free] = WHITE
+
+    if self.heat is not None:
+      scale = self.scale
+      heat = np.repeat(np.repeat(self.heat[window].T, scale, 0), scale, 1) #rows are y
+      hot = free & ~np.isnan(heat)
+      t = heat[hot][:, None]
+      image[hot] = ((1 - t)*np.array(COOL) + t*np.array(WARM)).astype(np.uint8)
+
+    if self.pathmask is not None:
+      signatures = self.pathmask[window]
+      onPath = np.repeat(np.repeat(self.onPath[window].T, self.scale, 0), self.scale, 1)
+      image[tileImage(self.pathTiles, signatures) & onPath] = RED
+
+    for node, color in ((self.start, RED), (self.goal, GREEN)):
+      if node is not None and x0 <= node[0] < x1 and y0 <= node[1] < y1:
+        i, j = (node[0] - x0)*self.scale, (node[1] - y0)*self.scale
+        block = image[j:j + self.scale, i:i + self.scale]
+        block[self.markTiles[0]] = color
+
+    return image[::-1] #+y up
+
+  def save(self, filename, **window):
+    """ write the image to a .png or .npy file
+        window: x0, y0, x1, y1 as in render
+    """
+    image = self.render(**window)
+    if filename.endswith('.npy'):
+      np.save(filename, image)
+    else:
+      writePng(filename, image)
+
+  def saveTiles(self, directory, tileNodes=512, extension='png'):
+    """ write the image as a grid of files, for mazes too big for one image
+        tile r_c covers row r counted from the top and column c counted from the left
+        directory: where to write the tiles, created if needed
+        tileNodes: nodes along each side of a tile
+        returns the list of files written
+    """
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+    count = (self.size + tileNodes - 1) // tileNodes
+    files = []
+    for r in range(count):
+      y1 = self.size - r*tileNodes
+      for c in range(count):
+        filename = os.path.join(directory, 'tile_%d_%d.%s' % (r, c, extension))
+        self.save(filename, x0=c*tileNodes, y0=max(0, y1 - tileNodes), x1=(c + 1)*tileNodes, y1=y1)
+        files.append(filename)
+    return files
+
+
+if __name__ == '__main__':
+  import argparse
+  import random
+  import sys
+  from maze import Maze
+  from astar import Astar
+
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('output', help='.png or .npy file, or a directory with --tile')
+  parser.add_argument('--size', type=int, default=10)
+  parser.add_argument('--seed', type=int)
+  parser.add_argument('--scale', type=int, default=8, help='pixels per node')
+  parser.add_argument('--tile', type=int, help='nodes per tile side')
+  parser.add_argument('--heatmap', action='store_true', help='color nodes by A* expansion order')
+  args = parser.parse_args()
+
+  random.seed(args.seed)
+  sys.setrecursionlimit(max(sys.getrecursionlimit(), 4*args.size**2)) #maze generation recurses per node
+  m = Maze(args.size)
+  goal = (random.randint(0, m.size - 1), random.randint(0, m.size - 1))
+  a = Astar(m.graph, (0, 0), goal)
+  path = [goal]
+  while a.came_from[path[-1]]:
+    path.append(a.came_from[path[-1]])
+  heatmap = getExpansionMap(a.expanded, m.size) if args.heatmap else None
+
+  raster = MazeRaster(m.getBitmask(), path[::-1], heatmap=heatmap, scale=args.scale)
+  if args.tile:
+    print('\n'.join(raster.saveTiles(args.output, args.tile)))
+  else:
+    raster.save(args.output)
@@ -0,0 +1,115 @@
+import numpy as np
+from matplotlib import patches, pyplot as plt
+from maze import getOrientation
+from maze_raster import getTiles, tileImage
+
+
+class MazeRenderer(object):
+  """ Draws a maze once as an image and then redraws only what moves
+      the robot marker and the path are animated artists blitted over a cached
+      background, so the cost of a frame does not depend on the maze size.
+      walls are black and paths white like the original patch plots, node i, j
+      is centered on x = i, y = j
+  """
+  def __init__(self, bitmask, start=None, goal=None, scale=10, pathWidth=.35):
+    """ bitmask: 4 bit path signatures from Maze.getBitmask, zeros for an empty maze
+        start, goal: optional nodes marked red and green
+        scale: image pixels per node
+        pathWidth: half width of the paths, in nodes
+    """
+    self.size = bitmask.shape[0]
+    self.scale = scale
+    self.pathWidth = pathWidth
+    self.bitmask = np.array(bitmask, dtype=np.uint8)
+
+    self.tiles = getTiles(scale, pathWidth, center=False).astype(np.uint8) #a node without paths stays black
+
+    self.figure = plt.gcf()
+    self.figure.clf()
+    self.ax = self.figure.gca()
+    self.ax.axis([-1, self.size, -1, self.size])
+    if hasattr(self.ax, 'set_facecolor'):
+      self.ax.set_facecolor('black')
+    else: #matplotlib before 2.0
+      self.ax.set_axis_bgcolor('black')
+    self.image = self.ax.imshow(self.getRaster(), cmap='gray', vmin=0, vmax=1, origin='lower',
+                                interpolation='nearest', extent=(-.5, self.size - .5, -.5, self.size - .5))
+
+    radius = float(self.size)/40
+    if start is not None:
+      self.ax.add_artist(plt.Circle(start, radius, color='r'))
+    if goal is not None:
+      self.ax.add_artist(plt.Circle(goal, radius, color='g'))
+    self.location = plt.Circle((0, 0), radius, color='k', animated=True, visible=False)
+    self.ax.add_artist(self.location)
+    self.path, = self.ax.plot([], [], 'red', animated=True)
+
+    self.background = None
+    self.opened = [] #paths opened since the background was saved
+    self.figure.canvas.mpl_connect('draw_event', self.onDraw)
+    plt.show(block=False)
+    self.figure.canvas.draw()
+
+  def getRaster(self):
+    """ returns the maze image, rows are y and columns are x """
+    return tileImage(self.tiles, self.bitmask)
+
+  def onDraw(self, event):
+    """ save the static background after every full redraw, e.g. when the window is resized """
+    self.background = self.figure.canvas.copy_from_bbox(self.ax.bbox)
+    self.opened = []
+    self.drawAnimated()
+
+  def connect(self, node1, node2):
+    """ open the path between two neighboring nodes
+        the image is kept up to date for full redraws, in between only the new
+        path is painted over the background
+        node1, node2: node coordinates
+    """
+    if tuple(node1) == tuple(node2): #backtracking links the start node to itself
+      return
+    self.bitmask[node1[0], node1[1]] |= 1 << getOrientation(node1, node2)
+    self.bitmask[node2[0], node2[1]] |= 1 << getOrientation(node2, node1)
+    data = self.image.get_array()
+    for x, y in (node1, node2):
+      data[y*self.scale:(y + 1)*self.scale, x*self.scale:(x + 1)*self.scale] = self.tiles[self.bitmask[x, y]]
+    self.image.set_data(data)
+
+    pd = self.pathWidth
+    corner = (min(node1[0], node2[0]) - pd, min(node1[1], node2[1]) - pd)
+    width = abs(node1[0] - node2[0]) + 2*pd
+    height = abs(node1[1] - node2[1]) + 2*pd
+    rectangle = patches.Rectangle(corner, width, height, linewidth=0, fc='w')
+    rectangle.axes = self.ax
+    rectangle.set_figure(self.figure)
+    rectangle.set_transform(self.ax.transData)
+    self.opened.append(rectangle)
+
+  def setPath(self, path):
+    """ path: list of node coordinates to draw as a line """
+    self.path.set_data([p[0] for p in path], [p[1] for p in path])
+
+  def setLocation(self, current):
+    """ current: coordinates of the robot """
+    self.location.center = current
+    self.location.set_visible(True)
+
+  def drawAnimated(self):
+    self.ax.draw_artist(self.path)
+    self.ax.draw_artist(self.location)
+
+  def update(self):
+    """ show the changes since the last update without redrawing the whole figure """
+    canvas = self.figure.canvas
+    if self.background is None:
+      canvas.draw()
+    else:
+      canvas.restore_region(self.background)
+      if self.opened: #fold the new paths into the background
+        for rectangle in self.opened:
+          self.ax.draw_artist(rectangle)
+        self.background = canvas.copy_from_bbox(self.ax.bbox)
+        self.opened = []
+      self.drawAnimated()
+      canvas.blit(self.ax.bbox)
+    canvas.flush_events()
@@ -4,6 +4,8 @@
     distance from the obstacle immediately in front of it """
 
 import math
+import os
+import threading
 import rospy
 from sensor_msgs.msg import LaserScan
 from std_msgs.msg import Header
@@ -11,24 +13,68 @@ from nav_msgs.msg import Odometry
 from maze_projector import MazeProjector
 from geometry_msgs.msg import Twist, Vector3, PointStamped, Point
 from maze_solver import MazeSolver
+from maze import Maze
+from maze_store import MazeStore
+from raycaster import MazeRaycaster
+from human_detector import HumanDetector, HumanTracker
+from sensor_log import SensorRecorder
+from cost_model import TraversalCostModel
+from planner import BackgroundPlanner
+from plan_client import PlanClient, getCostParameters
 from tf import TransformListener, TransformBroadcaster
 from tf.transformations import euler_from_quaternion
 from helpers import *
 
 class MazeNavigator(object):
     """ Main controller for the robot maze solver """
-    def __init__(self):
-        """ Main controller """
-        rospy.init_node('maze_navigator')
+    def __init__(self, viz=True, record=None, costModel=None, store=None, planServer=None, maze=None, goal=None):
+        """ Main controller, rospy.init_node must have been called
+            viz: optional parameter to plot the robot's progress through the maze
+            record: optional path of a sensor log to append /scan and /odom to
+            costModel: TraversalCostModel the path is planned with, by default one
+                that matches this controller
+            store: optional name of a MazeStore to take the maze from instead of generating one
+            planServer: optional Unix socket of a plan_server to do the path searches
+            maze: optional Maze to traverse, such as the one of a replayed log, or a ChunkedMaze
+              with a goal and neither viz, store nor planServer
+            goal: optional node to get to, a random one by default
+        """
+        if maze is not None and maze.size is None and (viz or store or planServer):
+            raise ValueError('an unbounded maze cannot be plotted, kept in a store or sent to a plan server')
+        self.viz = viz
+        self.recorder = None
+        if record:
+            self.recorder = SensorRecorder(record, rospy.get_time)
+            self.recorder.recordState() #lets a replay generate the same maze
 
         self.odom = None
         self.prevOdom = None
+        self.origin = None #(odometry, node) on the start node facing orientation 0, places the maze in the odom frame
         self.scan = []
+        self.scanStamp = 0 #time of the last scan in seconds
         self.projected = []
 
-        self.solver = MazeSolver()
+        self.costModel = costModel or TraversalCostModel(nodeDistance=.8, linearSpeed=.4)
+        self.store = MazeStore.attach(store) if store else None #maze shared with other processes
+        if not maze and self.store:
+            maze = Maze.fromBitmask(self.store.bitmask)
+        self.client = None
+        if planServer:
+            maze = maze or Maze(10)
+            self.client = PlanClient(planServer)
+            self.mazeName = store or 'navigator_%d' % os.getpid() #what the server holds the maze under
+            self.client.load(self.mazeName, store=store, bitmask=None if store else maze.getBitmask())
+            goal = goal or MazeSolver.getRandomGoal(maze)
+            self.solver = self.client.getSolver(maze, self.mazeName, (0, 0), goal, costModel=self.costModel)
+            if not self.solver:
+                raise ValueError('plan server %s has no path from (0, 0) to %s' % (planServer, goal))
+        else:
+            self.solver = MazeSolver(costModel=self.costModel, maze=maze, goal=goal) #quickest path for this robot
         self.listener = TransformListener()
         self.broadcaster = TransformBroadcaster()
+        self.transforms = TransformCache(self.listener, self.broadcaster) #map to odom fix-up off the control loop
+        self.planner = BackgroundPlanner(self.solver.m, self.costModel, self.client,
+                                         self.mazeName if self.client else None) #new paths while the robot keeps driving
 
         self.counter = 0
 
@@ -37,16 +83,42 @@ class MazeNavigator(object):
         self.laserScan = LaserScan()
         self.turn = True #turning or moving straight
 
+        #drive straight through the nodes of a corridor instead of stopping at each
+        self.mergeStraight = True
+        self.runs = None #instructions from solver.getRuns, made on the first control update
+        self.runI = 0 #index of the run being performed
+        self.runStart = 0 #index in the path of the node the run started from
+        self.runOdom = None #odometry when the run started
+        self.maxSpeed = .4 # fastest forward speed, what a single node move starts at
+
+        #run control from the sensor callbacks instead of polling at 5Hz, ~event_driven and ~max_rate on the node
+        self.eventDriven = False
+        self.maxRate = 50 # most control updates per second in event driven mode
+        self.controlReady = threading.Condition()
+        self.controlPending = False #new sensor data since the last control update
+        self.published = None #(linear, angular, laser scan header, point) last published
+
         self.dist_centroid = 0
         self.angle_centroid = 0
         self.point = None
         self.foundHuman = False
         self.foundRealHuman = False
         self.humanThreshhold = .7  # distance that it will detect a human 
+        self.detector = HumanDetector(self.humanThreshhold)
+        self.tracker = HumanTracker(self.detector) #searches near the predicted human first
 
         self.maxDistance = .6
         self.wallDistance = .3
         self.nodeDistance = .8 # distance between nodes
+
+        #cast the maze scan from the odometry pose instead of the node center
+        self.continuousScan = True
+        self.beams = 360 # number of beams in the maze scan, 360 to 1440
+        self.raycaster = None
+        self.mazeVersion = None #store version the raycaster was built from
+        self.windowSize = 16 #nodes on a side of the part of an unbounded maze the raycaster is built from
+        self.window = (0, 0) #node that is [0, 0] of the raycaster's bitmask
+        self.updateRaycaster()
         
         #publish robot commands and fake lidar data
         self.pubScan = rospy.Publisher('/maze_scan', LaserScan, queue_size=10)
@@ -56,53 +128,84 @@ class MazeNavigator(object):
         #subscribe to robot position and real lidar data
         rospy.Subscriber('/odom', Odometry, self.callbackOdom)
         rospy.Subscriber('/scan', LaserScan, self.callbackScan)
+        rospy.Subscriber('/maze_goal', Point, self.callbackGoal)
 
-        self.solver.visualize((0, 0)) 
+        if self.viz:
+            self.solver.visualize((0, 0)) 
 
         
+    def getConfig(self):
+        """ returns the maze, goal and settings the robot drives with, for a replay to build the same navigator
+        """
+        maze = self.solver.m
+        if maze.size is None: #unbounded, the chunks are made again from their parameters
+            config = {'chunked': {'seed': maze.seed, 'chunkSize': maze.chunkSize, 'doors': maze.doors}}
+        else:
+            config = {'bitmask': maze.getBitmask().tolist()}
+        config.update({'goal': self.solver.goal,
+                       'store': self.store.name if self.store else None,
+                       'costModel': getCostParameters(self.costModel), 'mergeStraight': self.mergeStraight})
+        return config
+
+    def recordConfig(self):
+        """ save getConfig to the sensor log, call it once the settings are final
+        """
+        if self.recorder:
+            self.recorder.recordConfig(self.getConfig())
+
     def callbackScan(self, data):
         """ updates on new scan data
             data: LaserScan data
         """
+        if self.recorder:
+            self.recorder.recordScan(data)
         if not self.scan:
             self.laserScan = data
         self.scan = data.ranges
+        self.scanStamp = data.header.stamp.to_sec()
+        if self.continuousScan:
+            self.publishMazeScan(data.header.stamp)
+        if self.eventDriven:
+            self.requestControl()
 
     def callbackOdom(self, data):
         """ updates on new odom data
             data: Odometry data
         """
+        if self.recorder:
+            self.recorder.recordOdom(data)
         self.odom = convert_pose_to_xy_and_theta(data.pose)
         if not self.prevOdom: #first reading
             self.prevOdom = self.odom #no change
+            self.origin = (self.odom, self.solver.path[0])
+        if self.eventDriven:
+            self.requestControl()
+
+    def callbackGoal(self, data):
+        """ drive to a new goal node
+            data: Point with the node in x and y
+        """
+        self.setGoal((int(data.x), int(data.y)))
 
     def detectHuman(self):
         """ look at the robot's scan and detect where the centroid of the human is 
         """
 
-        # find a cluster of points within certain range
-        objectdict = {}
-        sumx = 0
-        sumy = 0
-        for i in range(0, 360):
-            if self.scan[i] !=0 and self.scan[i] < self.humanThreshhold:
-                locX = self.scan[i]*math.cos(i*math.pi/180.0)
-                locY = self.scan[i]*math.sin(i*math.pi/180.0)
-                objectdict[i] = [locX, locY]
-                sumx += locX
-                sumy += locY
-        if len(objectdict) !=0: #found a human
+        # track the cluster of points the human makes within certain range
+        human = self.tracker.update(self.scan, self.scanStamp, self.odom)
+        if human: #found a human
             #publish the centroid for rViz
-            centroid = [sumx/len(objectdict), sumy/len(objectdict)]
-            self.dist_centroid = math.sqrt(centroid[0]**2 + centroid[1]**2)
-            self.angle_centroid = math.atan2(centroid[1],centroid[0])
+            centroid = human.centroid
+            self.dist_centroid = human.distance
+            self.angle_centroid = human.bearing
             self.point = PointStamped(point=Point(x=-centroid[0], y=-centroid[1]), header=Header(stamp=rospy.Time.now(), frame_id='base_laser_link'))
             self.foundHuman = True
         else: #no human found
             self.foundHuman = False
         
         if self.foundHuman and self.projected: #compare human location to wall locations
-            self.projectedDistance = self.projected[int(self.angle_centroid*180/math.pi)]
+            beams = self.beams if self.continuousScan else 360
+            self.projectedDistance = self.projected[int(round(self.angle_centroid*beams/(2*math.pi))) % beams]
 
             if self.projectedDistance == 0 or self.projectedDistance > self.dist_centroid: #human closer than
                 self.foundRealHuman = True
@@ -113,30 +216,104 @@ class MazeNavigator(object):
 
 
     def updateNode(self, instruction):
-        """ updates visualization and publishes new scan data when a new node is reached
+        """ updates visualization and publishes new scan data when the end of a run is reached
             instruction: new instruction
         """
+        if not self.continuousScan: #the maze scan still shows the node before this one
+            self.projected = self.projectMaze(self.getWalls(instruction[1], self.solver.path[self.currentI + 1]))
         self.detectHuman()
 
         if self.foundRealHuman:
-            self.currentI += 1 #increment instruction
-            newNode = self.solver.path[self.currentI]
-            
             self.turn = True 
-            self.prevOdom = self.odom #update odometry
-            
+            self.runI += 1 #next run starts here
+            self.runStart = self.currentI + 1
+            self.runOdom = self.odom
+            self.reachNode(instruction, self.odom)
+            self.swapPlan(self.odom) #stopped and the human checked, a new plan can turn the robot here
+        
+        else:
+            self.twist.linear.x = 0 #stop the robot
+            self.twist.angular.z = 0 
+
+    def reachNode(self, instruction, odom):
+        """ move on to the next node of the path
+            instruction: instruction being performed
+            odom: odometry of the robot at the node
+        """
+        self.currentI += 1 #increment instruction
+        newNode = self.solver.path[self.currentI]
+
+        self.prevOdom = odom #update odometry
+
+        if not self.continuousScan: #otherwise cast with every real scan
             wall = self.getWalls(instruction[1], newNode)
             self.projected = self.projectMaze(wall) #get new laser scan 
-            
-            stamp = rospy.Time.now()
-            self.laserScan.ranges = tuple(self.projectMaze(wall)) #update laser scan
+            self.laserScan.ranges = tuple(self.projected) #update laser scan
             self.laserScan.header=Header(stamp=rospy.Time.now(),frame_id="base_laser_link")
-            fix_map_to_odom_transform(self, stamp, newNode, instruction[1], self.listener, self.broadcaster) #transform coordinate frames
+
+        stamp = rospy.Time.now()
+        self.transforms.request(stamp, newNode, instruction[1]) #transform coordinate frames in the background
+        if self.viz:
             self.solver.visualize(newNode) #update visualization
-        
+
+    def passNodes(self, instruction, diffPos):
+        """ keep track of the nodes driven through in the middle of a run
+            instruction: run being performed
+            diffPos: distance left to the end of the run
+        """
+        travelled = instruction[3]*self.nodeDistance - diffPos
+        while self.currentI - self.runStart + 1 < instruction[3] and \
+              travelled > (self.currentI - self.runStart + 1)*self.nodeDistance:
+            #odometry where the robot crossed the node, on the way from the start of the run
+            f = (self.currentI - self.runStart + 1)*self.nodeDistance / travelled
+            odom = (self.runOdom[0] + f*(self.odom[0] - self.runOdom[0]),
+                    self.runOdom[1] + f*(self.odom[1] - self.runOdom[1]), self.odom[2])
+            self.reachNode(instruction, odom)
+
+    def setGoal(self, goal, maze=None):
+        """ plan a path to a new goal in the background, the robot keeps driving
+            the old path to the end of its run, where it stops anyway, and takes
+            the new one from there
+            goal: node to get to
+            maze: Maze to plan in when the walls changed
+        """
+        if self.runs is None:
+            self.runs = self.solver.getRuns(self.mergeStraight)
+        #the node the current run ends on, or the last one when there is none
+        if self.runI < len(self.runs):
+            index = self.runStart + self.runs[self.runI][3]
         else:
-            self.twist.linear.x = 0 #stop the robot
-            self.twist.angular.z = 0 
+            index = len(self.solver.path) - 1
+        orientation = self.solver.instructions[index - 1][1] if index else 0
+        self.planner.request(index, self.solver.path[index], orientation, goal, maze)
+
+    def swapPlan(self, odom):
+        """ switch to the latest plan if it starts from the node just reached,
+            only called where the robot has stopped at the end of a run
+            odom: odometry of the robot at the node
+            returns True when the plan was swapped in
+        """
+        plan = self.planner.take()
+        if not plan:
+            return False
+        index, solver = plan
+        if index != self.currentI: #planned from a node already passed, try again from the next
+            self.setGoal(solver.goal, solver.m)
+            return False
+
+        #the path so far stays, so currentI keeps pointing at this node
+        self.solver.path = self.solver.path[:index] + solver.path
+        self.solver.instructions = self.solver.instructions[:index] + solver.instructions
+        self.solver.goal = solver.goal
+        self.solver.m = solver.m
+        self.runs = solver.getRuns(self.mergeStraight)
+        self.runI = 0
+        self.runStart = index
+        self.runOdom = odom
+        self.turn = True
+        if self.solver.renderer:
+            self.solver.renderer.setPath(self.solver.path)
+        return True
 
     def performInstruction(self):
         """ sets twist and updates maze scan
@@ -146,9 +323,13 @@ class MazeNavigator(object):
             return
 
         c = .5 #proportional control constant
-        instruction = self.solver.instructions[self.currentI]
+        if self.runs is None:
+            self.runs = self.solver.getRuns(self.mergeStraight)
+        if not self.runOdom:
+            self.runOdom = self.prevOdom
+        instruction = self.runs[self.runI]
 
-        if not self.projected:
+        if not self.projected and not self.continuousScan:
             newNode = self.solver.path[self.currentI]
             wall = self.getWalls(instruction[1], newNode)
             self.projected = self.projectMaze(wall) #get new laser scan 
@@ -158,24 +339,29 @@ class MazeNavigator(object):
         if abs(diffAng)%(2*math.pi) < .05: #turned to correct orientation
             self.turn = False
         
-        if abs(diffPos) < .05: #moved forward successfully to next node
+        if abs(diffPos) < .05: #moved forward successfully to the end of the run
             self.updateNode(instruction)
+        elif not self.turn:
+            self.passNodes(instruction, diffPos)
 
         if self.turn: #set angular velocity
             self.twist.angular.z = c * diffAng
             self.twist.linear.x = 0
 
         else: #set linear velocity
-            self.twist.linear.x = c *diffPos
+            self.twist.linear.x = min(c *diffPos, self.maxSpeed)
             self.twist.angular.z = 0
 
     def calcDifference(self, instruction):
-        """ calculate the difference in position and orientation between current and previous odometry
+        """ calculate the difference in position and orientation between the robot and the end of the run
+            both are taken in the maze frame of getMazePose, so the tolerances of earlier runs do not add up
             returns tuple of form (difference in position, difference in orientation)
         """
-        
-        diffPos = self.nodeDistance - math.sqrt((self.odom[0] - self.prevOdom[0])**2 + (self.odom[1] - self.prevOdom[1])**2)
-        diffAng = instruction[0] - angle_diff(self.odom[2],self.prevOdom[2])
+        x, y, heading = self.getMazePose()
+        end = self.solver.path[self.runStart + instruction[3]]
+        target = math.pi/2 - instruction[1]*math.pi/2 #heading of the run, orientation 0 faces +y
+        diffPos = (end[0]*self.nodeDistance - x)*math.cos(target) + (end[1]*self.nodeDistance - y)*math.sin(target)
+        diffAng = angle_diff(target, heading)
         return diffPos, diffAng
 
     def getWalls(self, orientation, currentNode):
@@ -194,6 +380,71 @@ class MazeNavigator(object):
         return walls[orientation:] + walls[:orientation] #rotated depending on robot's position
 
 
+    def getMazePose(self):
+        """ get the robot pose in the maze frame from odometry
+            the maze frame has node (0, 0) at the origin and measures headings from +x,
+            it stays where the first odometry placed it, so the pose does not depend on the
+            node the control loop has counted to and can be read from any thread
+            returns tuple of form (x, y, heading)
+        """
+        odom = self.odom #replaced whole by the callback, so read once
+        (x0, y0, yaw0), node = self.origin
+        offset = math.pi/2 - yaw0 #rotates odom into the maze frame, orientation 0 faces +y
+
+        dx = odom[0] - x0
+        dy = odom[1] - y0
+        x = node[0]*self.nodeDistance + dx*math.cos(offset) - dy*math.sin(offset)
+        y = node[1]*self.nodeDistance + dx*math.sin(offset) + dy*math.cos(offset)
+        return x, y, angle_normalize(odom[2] + offset)
+
+    def publishMazeScan(self, stamp):
+        """ cast and publish the maze scan for the current odometry pose
+            stamp: time of the real scan the maze scan goes with
+        """
+        if not self.origin or self.currentI >= len(self.solver.path):
+            return
+
+        self.updateRaycaster()
+        x, y, heading = self.getMazePose()
+        x, y = x - self.window[0]*self.nodeDistance, y - self.window[1]*self.nodeDistance
+        increment = 2*math.pi / self.beams
+        scan = LaserScan(header=Header(stamp=stamp, frame_id="base_laser_link"),
+                         angle_min=0, angle_max=2*math.pi - increment, angle_increment=increment,
+                         range_min=self.laserScan.range_min, range_max=self.laserScan.range_max,
+                         ranges=tuple(self.raycaster.cast(x, y, heading, self.beams)))
+        self.projected = scan.ranges #walls as seen from where the robot really is
+        self.pubScan.publish(scan)
+
+    def updateRaycaster(self):
+        """ build the raycaster, and rebuild it and replan whenever another process changes the walls in the store
+        """
+        if self.store:
+            if self.store.getVersion() == self.mazeVersion:
+                return
+            changed = self.mazeVersion is not None
+            try:
+                bitmask, self.mazeVersion = self.store.read()
+            except IOError as e:
+                if not changed: #no maze to fall back on yet
+                    raise
+                rospy.logwarn('keeping the maze of version %d: %s' % (self.mazeVersion, e))
+                return
+            if changed:
+                self.setGoal(self.solver.goal, Maze.fromBitmask(bitmask))
+        elif self.solver.m.size is None: #unbounded, cast from a window that moves along with the robot
+            node = self.solver.path[min(self.currentI, len(self.solver.path) - 1)]
+            margin = self.windowSize // 4 #nodes between the robot and the closed paths at the window's edge
+            if self.raycaster and all(self.window[k] + margin <= node[k] < self.window[k] + self.windowSize - margin
+                                      for k in range(2)):
+                return
+            self.window = (node[0] - self.windowSize // 2, node[1] - self.windowSize // 2)
+            bitmask = self.solver.m.getWindow(self.window, self.windowSize)
+        elif self.raycaster:
+            return
+        else:
+            bitmask = self.solver.m.getBitmask()
+        self.raycaster = MazeRaycaster(bitmask, self.nodeDistance, self.wallDistance, self.maxDistance)
+
     def projectMaze(self, wall):
         """ get 'laser scan' ranges for the virtual maze based on surrounding walls
             wall: list with binary entries, output from getWalls
@@ -236,26 +487,107 @@ class MazeNavigator(object):
         return projected
 
             
+    def requestControl(self):
+        """ wake up the event driven control loop, messages that arrive
+            before it gets to run are coalesced into one update
+        """
+        with self.controlReady:
+            self.controlPending = True
+            self.controlReady.notify()
+
+    def publishChanges(self):
+        """ publish the robot commands, maze scan and centroid, but only the ones
+            that changed since they were last published
+        """
+        last = self.published or (None, None, None, None)
+        current = (self.twist.linear.x, self.twist.angular.z, self.laserScan.header, self.point)
+        if current[:2] != last[:2]:
+            self.pubVel.publish(self.twist)
+        if not self.continuousScan and current[2] is not last[2]: #a new node was reached
+            self.pubScan.publish(self.laserScan)
+        if self.point and current[3] is not last[3]:
+            self.pubToViz.publish(self.point)
+        self.published = current
+
+    def controlStep(self):
+        """ one control update of the event driven loop
+            returns False once every instruction has been performed
+            and no new plan is on the way
+        """
+        if self.currentI >= len(self.solver.instructions): #at the goal, drive on if a new plan came in
+            self.swapPlan(self.odom)
+        if self.currentI < len(self.solver.instructions): #still have instructions to perform
+            self.performInstruction()
+            self.publishChanges()
+            return True
+
+        self.twist.linear.x = 0 #stop the robot
+        self.twist.angular.z = 0
+        self.pubVel.publish(self.twist)
+        return self.planner.isBusy() #a new goal may still be on the way
+
+    def pollStep(self):
+        """ one control update of the 5Hz loop, publishes everything every time
+            returns False once every instruction has been performed
+            and no new plan is on the way
+        """
+        if self.currentI >= len(self.solver.instructions): #at the goal, drive on if a new plan came in
+            self.swapPlan(self.odom)
+        if self.currentI < len(self.solver.instructions): #still have instructions to perform
+            self.performInstruction()
+            if not self.continuousScan: #otherwise published with each real scan
+                self.pubScan.publish(self.laserScan) #publish scans
+            self.pubVel.publish(self.twist)
+            if self.point:
+                self.pubToViz.publish(self.point)
+            return True
+
+        self.twist.linear.x = 0 #stop the robot
+        self.twist.angular.z = 0
+        self.pubVel.publish(self.twist)
+        return self.planner.isBusy() #a new goal may still be on the way
+
+    def runEventDriven(self):
+        """ run loop that updates control whenever odometry or scan data arrives,
+            at most maxRate times a second
+        """
+        rospy.on_shutdown(self.requestControl) #wake up to exit
+        period = 1.0 / self.maxRate
+        while not rospy.is_shutdown():
+            with self.controlReady:
+                while not self.controlPending:
+                    self.controlReady.wait()
+                self.controlPending = False
+            if rospy.is_shutdown():
+                break
+
+            start = rospy.get_time()
+            if not self.controlStep():
+                print "done traversing the maze"
+                break #exit
+            remaining = period - (rospy.get_time() - start)
+            if remaining > 0:
+                rospy.sleep(remaining) #anything arriving meanwhile waits for the next update
+
     def run(self):
         """ Our main 5Hz run loop
         """
+        self.recordConfig()
+        if self.eventDriven:
+            self.runEventDriven()
+            return
+
         r = rospy.Rate(5)
         while not rospy.is_shutdown():
-            if self.currentI < len(self.solver.instructions): #still have instructions to perform
-                self.performInstruction()
-                self.pubScan.publish(self.laserScan) #publish scans
-                self.pubVel.publish(self.twist)
-                if self.point:
-                    self.pubToViz.publish(self.point)
-                r.sleep()
-
-            else: 
-                self.twist.linear.x = 0 #stop the robot
-                self.twist.angular.z = 0
-                self.pubVel.publish(self.twist)
+            if not self.pollStep():
                 print "done traversing the maze"
                 break #exit
+            r.sleep()
             
 if __name__ == '__main__':
-    node = MazeNavigator()
+    rospy.init_node('maze_navigator') #before the private parameters, they resolve against the node name
+    node = MazeNavigator(viz=rospy.get_param('~viz', True), record=rospy.get_param('~record', None),
+                         store=rospy.get_param('~maze_store', None), planServer=rospy.get_param('~plan_server', None))
+    node.eventDriven = rospy.get_param('~event_driven', node.eventDriven)
+    node.maxRate = rospy.get_param('~max_rate', node.maxRate)
     node.run()
\ No newline at end of file
@@ -0,0 +1,503 @@
+#!/usr/bin/env python
+
+""" Headless simulation of MazeNavigator that runs faster than real time
+    in-process stand-ins replace rospy, the message packages and tf, a
+    kinematic model turns /cmd_vel into /odom and a simulated human leading
+    the robot along its path shows up in /scan. One process manages about
+    100 to 200 traversals of a 10 x 10 maze per minute, thousands per minute
+    need -j to spread them over ten or more cores """
+
+import math
+import random
+import sys
+import threading
+import time
+import types
+import numpy as np
+
+active = None #the MazeSimulation the stand-ins talk to
+
+
+class Time(object):
+  """ stand-in for rospy.Time, only keeps seconds """
+  def __init__(self, secs=0, nsecs=0):
+    self.secs = secs + nsecs * 1e-9
+
+  @staticmethod
+  def now():
+    return Time(active.now)
+
+  def to_sec(self):
+    return self.secs
+
+
+class Duration(Time):
+  """ stand-in for rospy.Duration """
+  pass
+
+
+class Rate(object):
+  """ stand-in for rospy.Rate, sleeping advances the simulation """
+  def __init__(self, hz):
+    self.period = 1.0 / hz
+
+  def sleep(self):
+    active.advance(self.period)
+
+
+class Publisher(object):
+  """ stand-in for rospy.Publisher, messages go to the simulation """
+  def __init__(self, topic, dataClass, queue_size=None):
+    self.topic = topic
+
+  def publish(self, msg):
+    active.receive(self.topic, msg)
+
+
+class Subscriber(object):
+  """ stand-in for rospy.Subscriber, the simulation calls back on its topics """
+  def __init__(self, topic, dataClass, callback):
+    active.subscribers.setdefault(topic, []).append(callback)
+
+
+def is_shutdown():
+  """ background threads such as TransformCache's stop right away, tf is not simulated """
+  return active is None or active.done or threading.current_thread() is not active.thread
+
+def get_time():
+  return active.now
+
+def get_rostime():
+  return Time(active.now)
+
+def sleep(duration):
+  active.advance(duration.to_sec() if isinstance(duration, Time) else duration)
+
+def init_node(name, **kwargs):
+  pass
+
+def on_shutdown(hook):
+  pass
+
+def logwarn(text):
+  sys.stderr.write('[WARN] %s\n' % text)
+
+
+def message(name, **fields):
+  """ makes a stand-in message class
+      fields: default for each field, a message class default gives every message its own
+  """
+  nested = [(field, default) for field, default in fields.items() if isinstance(default, type)]
+  def __init__(self, **kwargs):
+    for field, default in nested:
+      if field not in kwargs:
+        setattr(self, field, default())
+    for field, value in kwargs.items():
+      setattr(self, field, value)
+  members = dict(fields) #plain defaults live on the class
+  members['__init__'] = __init__
+  return type(name, (object,), members)
+
+Header = message('Header', seq=0, stamp=Time, frame_id='')
+Point = message('Point', x=0.0, y=0.0, z=0.0)
+Vector3 = message('Vector3', x=0.0, y=0.0, z=0.0)
+Quaternion = message('Quaternion', x=0.0, y=0.0, z=0.0, w=1.0)
+Pose = message('Pose', position=Point, orientation=Quaternion)
+PoseStamped = message('PoseStamped', header=Header, pose=Pose)
+PointStamped = message('PointStamped', header=Header, point=Point)
+PoseWithCovariance = message('PoseWithCovariance', pose=Pose, covariance=())
+Twist = message('Twist', linear=Vector3, angular=Vector3)
+TwistWithCovariance = message('TwistWithCovariance', twist=Twist, covariance=())
+Odometry = message('Odometry', header=Header, child_frame_id='', pose=PoseWithCovariance, twist=TwistWithCovariance)
+LaserScan = message('LaserScan', header=Header, angle_min=0.0, angle_max=0.0, angle_increment=0.0,
+                    time_increment=0.0, scan_time=0.0, range_min=0.0, range_max=0.0, ranges=(), intensities=())
+
+
+class LookupException(Exception):
+  pass
+
+class ConnectivityException(Exception):
+  pass
+
+class ExtrapolationException(Exception):
+  pass
+
+class TransformListener(object):
+  """ stand-in for tf.TransformListener that never has a transform """
+  def lookupTransform(self, target, source, stamp):
+    raise LookupException("tf is not simulated")
+
+  def waitForTransform(self, target, source, stamp, timeout):
+    pass
+
+class TransformBroadcaster(object):
+  """ stand-in for tf.TransformBroadcaster that drops everything """
+  def sendTransform(self, translation, rotation, stamp, child, parent):
+    pass
+
+
+def quaternion_from_euler(ai, aj, ak):
+  ci, si = math.cos(ai/2), math.sin(ai/2)
+  cj, sj = math.cos(aj/2), math.sin(aj/2)
+  ck, sk = math.cos(ak/2), math.sin(ak/2)
+  return np.array([si*cj*ck - ci*sj*sk, ci*sj*ck + si*cj*sk, ci*cj*sk - si*sj*ck, ci*cj*ck + si*sj*sk])
+
+def euler_from_quaternion(q):
+  x, y, z, w = q
+  roll = math.atan2(2*(w*x + y*z), 1 - 2*(x*x + y*y))
+  pitch = math.asin(max(-1.0, min(1.0, 2*(w*y - z*x))))
+  yaw = math.atan2(2*(w*z + x*y), 1 - 2*(y*y + z*z))
+  return roll, pitch, yaw
+
+def quaternion_matrix(q):
+  x, y, z, w = q
+  return np.array([[1 - 2*(y*y + z*z), 2*(x*y - z*w), 2*(x*z + y*w), 0],
+                   [2*(x*y + z*w), 1 - 2*(x*x + z*z), 2*(y*z - x*w), 0],
+                   [2*(x*z - y*w), 2*(y*z + x*w), 1 - 2*(x*x + y*y), 0],
+                   [0, 0, 0, 1.0]])
+
+def quaternion_from_matrix(matrix):
+  M = np.asarray(matrix)
+  w = math.sqrt(max(0.0, 1 + M[0, 0] + M[1, 1] + M[2, 2])) / 2
+  x = math.copysign(math.sqrt(max(0.0, 1 + M[0, 0] - M[1, 1] - M[2, 2])) / 2, M[2, 1] - M[1, 2])
+  y = math.copysign(math.sqrt(max(0.0, 1 - M[0, 0] + M[1, 1] - M[2, 2])) / 2, M[0, 2] - M[2, 0])
+  z = math.copysign(math.sqrt(max(0.0, 1 - M[0, 0] - M[1, 1] + M[2, 2])) / 2, M[1, 0] - M[0, 1])
+  return np.array([x, y, z, w])
+
+def rotation_matrix(angle, direction):
+  x, y, z = np.asarray(direction, dtype=float) / np.linalg.norm(direction)
+  s = math.sin(angle/2)
+  return quaternion_matrix((x*s, y*s, z*s, math.cos(angle/2)))
+
+def translation_matrix(vector):
+  M = np.identity(4)
+  M[:3, 3] = vector[:3]
+  return M
+
+def translation_from_matrix(matrix):
+  return np.array(matrix)[:3, 3].copy()
+
+def inverse_matrix(matrix):
+  return np.linalg.inv(matrix)
+
+
+def installStandIns():
+  """ put the stand-in modules in place of rospy, the message packages and tf
+      must run before maze_robot is imported
+  """
+  this = sys.modules[__name__]
+  def module(name, members):
+    mod = types.ModuleType(name)
+    for member in members:
+      setattr(mod, member, getattr(this, member))
+    sys.modules[name] = mod
+    return mod
+
+  module('rospy', ['Time', 'Duration', 'Rate', 'Publisher', 'Subscriber', 'is_shutdown', 'get_time',
+                   'get_rostime', 'sleep', 'init_node', 'on_shutdown', 'logwarn'])
+  for package, members in [('std_msgs', ['Header']),
+                           ('sensor_msgs', ['LaserScan']),
+                           ('nav_msgs', ['Odometry']),
+                           ('geometry_msgs', ['Point', 'Vector3', 'Quaternion', 'Pose', 'PoseStamped',
+                                              'PointStamped', 'PoseWithCovariance', 'Twist'])]:
+    module(package, []).msg = module(package + '.msg', members)
+  module('tf', ['TransformListener', 'TransformBroadcaster', 'LookupException', 'ConnectivityException',
+                'ExtrapolationException']).transformations = \
+    module('tf.transformations', ['quaternion_from_euler', 'euler_from_quaternion', 'quaternion_matrix',
+                                  'quaternion_from_matrix', 'rotation_matrix', 'translation_matrix',
+                                  'translation_from_matrix', 'inverse_matrix'])
+
+
+class MazeSimulation(object):
+  """ One traversal of a random maze by a MazeNavigator in simulated time
+      odometry is exact and starts at the origin facing +y like the robot does on node (0, 0)
+  """
+  def __init__(self, seed=None, eventDriven=False, continuousScan=True, mergeStraight=True, odomRate=20, scanRate=5,
+               humanLead=.5, humanRadius=.15, rangeNoise=.005, timeout=1800, record=None, costModel=None,
+               store=None, goalChange=None, planServer=None, unbounded=False):
+    """ seed: seeds the maze, the goal and the sensor noise
+        eventDriven: run the navigator's event driven control instead of its 5Hz loop
+        continuousScan: let the navigator cast its maze scan from the odometry pose
+        mergeStraight: let the navigator drive straight through the nodes of a corridor
+        odomRate: /odom messages per second
+        scanRate: /scan messages per second
+        humanLead: how far ahead along the path the human walks
+        humanRadius: radius of the human's legs as seen by the lidar
+        rangeNoise: standard deviation of the lidar ranges
+        timeout: simulated seconds before giving up on the traversal
+        record: optional path of a sensor log for the navigator to record to
+        costModel: optional TraversalCostModel for the navigator to plan with
+        store: optional name of a MazeStore holding the maze to traverse
+        goalChange: simulated seconds after which the navigator is sent to a new random goal
+        planServer: optional Unix socket of a plan_server for the navigator to plan with
+        unbounded: traverse a ChunkedMaze to goals up to reach nodes from (0, 0) on each axis instead of a 10 x 10 Maze
+    """
+    self.seed = seed
+    self.eventDriven = eventDriven
+    self.continuousScan = continuousScan
+    self.mergeStraight = mergeStraight
+    self.odomRate = odomRate
+    self.scanRate = scanRate
+    self.humanLead = humanLead
+    self.humanRadius = humanRadius
+    self.rangeNoise = rangeNoise
+    self.timeout = timeout
+    self.record = record
+    self.costModel = costModel
+    self.store = store
+    self.goalChange = goalChange
+    self.planServer = planServer
+    self.unbounded = unbounded
+    self.reach = 10 #how far from the start goals in an unbounded maze are
+
+    self.now = 0.0
+    self.done = False
+    self.thread = threading.current_thread()
+    self.subscribers = {} #topic: list of callbacks
+    self.published = {} #topic: number of messages
+    self.pose = (0.0, 0.0, math.pi/2) #x, y, heading of the robot
+    self.command = (0.0, 0.0) #linear and angular velocity from /cmd_vel
+    self.odomTicks = 0
+    self.scanTicks = 0
+    self.progress = 0.0 #distance the robot has come along the planned path
+
+    c = np.arange(360) * math.pi / 180
+    self.cos, self.sin = np.cos(c), np.sin(c)
+
+  def receive(self, topic, msg):
+    """ handle a message published by the navigator """
+    self.published[topic] = self.published.get(topic, 0) + 1
+    if topic == '/cmd_vel':
+      self.command = (msg.linear.x, msg.angular.z)
+
+  def deliver(self, topic, msg):
+    """ hand a message to everything subscribed to topic """
+    for callback in self.subscribers.get(topic, []):
+      callback(msg)
+
+  def move(self, dt):
+    """ drive the robot along an arc at the commanded velocities for dt seconds """
+    x, y, theta = self.pose
+    v, w = self.command
+    if abs(w) < 1e-9:
+      x += v * dt * math.cos(theta)
+      y += v * dt * math.sin(theta)
+    else:
+      x += v / w * (math.sin(theta + w*dt) - math.sin(theta))
+      y -= v / w * (math.cos(theta + w*dt) - math.cos(theta))
+    self.pose = (x, y, theta + w*dt)
+
+  def advance(self, duration):
+    """ move simulated time forward, delivering /odom and /scan as they fall due """
+    end = self.now + duration
+    while True:
+      nextOdom = self.odomTicks / float(self.odomRate)
+      nextScan = self.scanTicks / float(self.scanRate)
+      t = min(nextOdom, nextScan)
+      if t > end:
+        break
+      self.move(t - self.now)
+      self.now = t
+      if t == nextOdom:
+        self.odomTicks += 1
+        self.deliver('/odom', self.odometry())
+      if t == nextScan:
+        self.scanTicks += 1
+        self.deliver('/scan', self.laserScan())
+    self.move(end - self.now)
+    self.now = end
+
+  def odometry(self):
+    """ returns an Odometry message for the robot's pose, odom is the world frame """
+    x, y, theta = self.pose
+    orientation = Quaternion(z=math.sin(theta/2), w=math.cos(theta/2))
+    pose = PoseWithCovariance(pose=Pose(position=Point(x=x, y=y), orientation=orientation))
+    return Odometry(header=Header(stamp=Time(self.now), frame_id='odom'), child_frame_id='base_link', pose=pose)
+
+  def followPath(self, path):
+    """ update how far along path the robot has come from its true position
+        the robot is put on the nearest stretch of the path, and where stretches lie on top
+        of each other, as on the way back from a dead end, on the one closest ahead of the last progress
+        path: node coordinates of the navigator's plan, a new plan keeps the nodes already driven
+    """
+    L = self.nodeDistance
+    x, y, _ = self.pose
+    best = None
+    for k in range(len(path) - 1):
+      (ax, ay), (bx, by) = path[k], path[k + 1]
+      f = max(0.0, min(1.0, (x/L - ax)*(bx - ax) + (y/L - ay)*(by - ay)))
+      distance = math.hypot(ax + f*(bx - ax) - x/L, ay + f*(by - ay) - y/L)*L
+      progress = (k + f)*L
+      jump = progress - self.progress
+      score = distance + (jump/10 if jump > 0 else -jump) #the robot hardly ever backs up
+      if best is None or score < best[0]:
+        best = (score, progress)
+    self.progress = best[1] if best else 0.0
+
+  def humanOffset(self):
+    """ returns where the human stands in the robot frame
+        the human walks humanLead ahead of the robot along the planned path, placed
+        from the robot's true pose, and past the goal steps back along the path to let the robot in
+    """
+    L = self.nodeDistance
+    path = self.navigator.solver.path #changes with every new plan
+    self.followPath(path)
+    x, y, heading = self.pose #odometry is exact and starts on node (0, 0), so it is the maze frame
+    if len(path) < 2:
+      hx, hy = path[0][0]*L - x, path[0][1]*L - y
+    else:
+      total = (len(path) - 1)*L
+      s = min(self.progress + self.humanLead, total + self.humanLead)
+      if s > total:
+        s = 2*total - s
+      k = max(0, min(int(s / L), len(path) - 2))
+      f = s / L - k
+      (ax, ay), (bx, by) = path[k], path[k + 1]
+      hx, hy = (ax + f*(bx - ax))*L - x, (ay + f*(by - ay))*L - y
+    return hx*math.cos(heading) + hy*math.sin(heading), -hx*math.sin(heading) + hy*math.cos(heading)
+
+  def laserScan(self):
+    """ returns a 360 beam LaserScan that sees only the human, beam i points i degrees
+        counterclockwise from the front of the robot
+    """
+    dx, dy = self.humanOffset()
+    along = dx*self.cos + dy*self.sin
+    disc = along**2 - (dx*dx + dy*dy - self.humanRadius**2)
+    hit = (disc >= 0) & (along > 0)
+    ranges = np.zeros(360)
+    ranges[hit] = along[hit] - np.sqrt(disc[hit])
+    if self.rangeNoise:
+      ranges[hit] += self.random.normal(0, self.rangeNoise, hit.sum())
+    return LaserScan(header=Header(stamp=Time(self.now), frame_id='base_laser_link'),
+                     angle_min=0.0, angle_max=2*math.pi - math.pi/180, angle_increment=math.pi/180,
+                     range_min=.02, range_max=5.0, ranges=tuple(ranges))
+
+  def randomGoal(self):
+    """ returns a random node of the navigator's maze, or within reach of the start of an unbounded one """
+    if self.unbounded:
+      return tuple(int(k) for k in self.random.randint(-self.reach, self.reach + 1, 2))
+    size = self.navigator.solver.m.size
+    return (int(self.random.randint(size)), int(self.random.randint(size)))
+
+  def run(self):
+    """ build a navigator and let it traverse its maze
+        returns a dict with the traversal time in simulated seconds, whether the goal
+        was reached, the number of nodes on the path, of control updates and of /cmd_vel messages
+    """
+    global active
+    installStandIns()
+    from maze_robot import MazeNavigator
+    from chunked_maze import ChunkedMaze
+
+    active = self
+    random.seed(self.seed) #the maze and the goal come from random
+    self.random = np.random.RandomState(self.seed)
+    maze = goal = None
+    if self.unbounded:
+      maze, goal = ChunkedMaze(self.seed or 0, chunkSize=8), self.randomGoal() #small chunks, so paths cross several
+    navigator = self.navigator = MazeNavigator(viz=False, record=self.record, costModel=self.costModel,
+                                                  store=self.store, planServer=self.planServer, maze=maze, goal=goal)
+    navigator.eventDriven = self.eventDriven
+    navigator.continuousScan = self.continuousScan
+    navigator.mergeStraight = self.mergeStraight
+    navigator.recordConfig()
+    self.nodeDistance = navigator.nodeDistance
+    goal = self.randomGoal() if self.goalChange is not None else None
+
+    period = 1.0 / navigator.maxRate if self.eventDriven else .2 #the 5Hz loop
+    steps = 0
+    finished = False
+    try:
+      self.advance(0) #first odom and scan
+      while not finished and self.now < self.timeout:
+        if goal and self.now >= self.goalChange:
+          navigator.setGoal(goal)
+          goal = None
+        if self.eventDriven:
+          if navigator.controlPending:
+            navigator.controlPending = False
+            finished = not navigator.controlStep()
+            steps += 1
+        else:
+          finished = not navigator.pollStep()
+          steps += 1
+        self.advance(period)
+    finally:
+      self.done = True
+      active = None
+      if navigator.recorder:
+        navigator.recorder.close()
+
+    return {'time': self.now, 'reached': finished, 'nodes': len(navigator.solver.path), 'steps': steps,
+            'commands': self.published.get('/cmd_vel', 0)}
+
+
+def percentile(values, q):
+  return float(np.percentile(values, q)) if values else float('nan')
+
+def simulate(args):
+  """ run one traversal, args is (seed, options) so it can go through a process pool """
+  seed, options = args
+  return MazeSimulation(seed, **options).run()
+
+def benchmark(traversals, jobs=1, seed=0, **options):
+  """ run many traversals and collect statistics
+      traversals: number of mazes to traverse
+      jobs: worker processes to spread them over
+      seed: seed of the first traversal, the rest count up from it
+      options: passed on to MazeSimulation
+      returns a dict of statistics
+  """
+  work = [(seed + k, options) for k in range(traversals)]
+  start = time.time()
+  if jobs > 1:
+    import multiprocessing
+    pool = multiprocessing.Pool(jobs)
+    results = pool.map(simulate, work, chunksize=max(1, traversals // (4*jobs)))
+    pool.close()
+  else:
+    results = [simulate(w) for w in work]
+  elapsed = time.time() - start
+
+  times = [r['time'] for r in results if r['reached']]
+  nodes = [r['nodes'] for r in results]
+  return {'traversals': traversals,
+          'reached': len(times),
+          'wall seconds': elapsed,
+          'traversals per minute': 60 * traversals / elapsed,
+          'simulated seconds per wall second': sum(r['time'] for r in results) / elapsed,
+          'traversal time mean': float(np.mean(times)) if times else float('nan'),
+          'traversal time median': percentile(times, 50),
+          'traversal time p95': percentile(times, 95),
+          'nodes mean': float(np.mean(nodes)),
+          'commands mean': float(np.mean([r['commands'] for r in results])),
+          'nodes min': min(nodes),
+          'nodes max': max(nodes),
+          'seconds per node': sum(times) / sum(r['nodes'] - 1 for r in results if r['reached']) if times else float('nan')}
+
+
+if __name__ == '__main__':
+  import argparse
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('-n', '--traversals', type=int, default=100)
+  parser.add_argument('-j', '--jobs', type=int, default=1,
+                      help='worker processes, each runs about 100 to 200 traversals per minute')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--event-driven', action='store_true')
+  parser.add_argument('--node-scan', action='store_true', help='project the maze scan from node centers')
+  parser.add_argument('--per-node', action='store_true', help='stop at every node instead of driving through corridors')
+  parser.add_argument('--store', help='traverse the maze in this MazeStore')
+  parser.add_argument('--plan-server', help='Unix socket of a plan_server to plan with')
+  parser.add_argument('--goal-change', type=float, help='send the robot to a new goal after this many seconds')
+  parser.add_argument('--record', help='sensor log to record a single traversal to')
+  parser.add_argument('--unbounded', action='store_true', help='traverse a ChunkedMaze instead of a 10 x 10 Maze')
+  args = parser.parse_args()
+  if args.record and args.traversals != 1:
+    parser.error('--record needs exactly one traversal')
+
+  stats = benchmark(args.traversals, args.jobs, args.seed,
+                    eventDriven=args.event_driven, continuousScan=not args.node_scan,
+                    mergeStraight=not args.per_node, record=args.record, store=args.store,
+                    goalChange=args.goal_change, planServer=args.plan_server, unbounded=args.unbounded)
+  for key in sorted(stats):
+    print('%-34s %s' % (key, stats[key]))
@@ -1,29 +1,64 @@
-from matplotlib import patches, pyplot as plt
 import math
 import random
-from maze import Maze
+from maze import Maze, getOrientation
 from astar import Astar
 import random
 import time
 
-class MazeSolver():
+class MazeSolver(object):
   """ A class that provides: 
         a path through a maze
         robot instructions to navigate it
         a visualization of the solved maze
   """
-  def __init__(self, viz=False):
-    self.m = Maze(10)
+  def __init__(self, viz=False, costModel=None, maze=None, start=(0, 0), goal=None, orientation=0):
+    """ viz: optional parameter to plot the search
+        costModel: optional TraversalCostModel to plan the quickest path instead of the default weights
+        maze: optional Maze to solve, a new 10 x 10 maze by default
+        start: node the robot starts from
+        goal: node to get to, a random one by default
+        orientation: orientation of the robot at the start, one of [0, 1, 2, 3]
+    """
+    self.m = maze or Maze(10)
 
-    self.start = (0, 0)
+    self.start = start
+    self.orientation = orientation
     self.wait = True
-    self.goal = (random.randint(0, self.m.size - 1), random.randint(0, self.m.size - 1)) #random point in the maze
+    self.renderer = None #draws the solved maze for visualize
+    if goal is None:
+      goal = self.getRandomGoal(self.m)
+    self.goal = goal
     if viz: 
       self.visualizeAstar()
-    self.a = Astar(self.m.graph,self.start, self.goal, viz=viz) #solve maze using astar
+    self.a = Astar(self.m.graph,self.start, self.goal, viz=viz, costModel=costModel, orientation=orientation) #solve maze using astar
     self.path = self.getPath()
     self.instructions = self.getInstructions()
 
+  @staticmethod
+  def getRandomGoal(maze):
+    """ returns a random node of a maze, the goal when none is given """
+    if maze.size is None:
+      raise ValueError('an unbounded maze has no random goal, give one')
+    return (random.randint(0, maze.size - 1), random.randint(0, maze.size - 1))
+
+  @classmethod
+  def fromPath(cls, maze, path, orientation=0):
+    """ builds a MazeSolver for a path found elsewhere, such as by a plan server
+        maze: Maze the path goes through
+        path: list of node coordinates from the start to the goal
+        orientation: orientation of the robot at the start, one of [0, 1, 2, 3]
+    """
+    s = cls.__new__(cls)
+    s.m = maze
+    s.path = [tuple(node) for node in path]
+    s.start, s.goal = s.path[0], s.path[-1]
+    s.orientation = orientation
+    s.wait = True
+    s.renderer = None
+    s.a = None #no search was run here
+    s.instructions = s.getInstructions()
+    return s
+
 
   def getInstructions(self):
     """ get turn instructions for the robot to execute 
@@ -37,7 +72,7 @@ class MazeSolver():
     for i in range(1, len(self.path)):
 
       if i == 1: #first instruction
-        orientation = 0 #assume robot facing 0 degrees
+        orientation = self.orientation #the way the robot faces at the start
       else:
         orientation = instructions[i-2][1] #last robot orientation
 
@@ -50,19 +85,31 @@ class MazeSolver():
 
     return instructions
 
+  def getRuns(self, merge=True):
+    """ get instructions that can move the robot more than one node at a time
+        merge: join each straight stretch of the path into one instruction,
+          otherwise every instruction moves one node like getInstructions
+        returns a list of tuples of form:
+          [(turn in radians,
+          orientation of the robot after the turn,
+          human readable instruction e.g. "left, forward 3",
+          number of nodes to move forward), ...]
+    """
+    runs = []
+    for turn, orientation, text in self.instructions:
+      if merge and runs and turn == 0: #keep going straight
+        runs[-1][3] += 1
+      else:
+        runs.append([turn, orientation, text, 1])
+    return [(turn, orientation, "%s, forward %d" % (text, nodes), nodes) for turn, orientation, text, nodes in runs]
+
   def getNextOrientation(self, currentNode, nextNode):
     """ get orientation of robot after the turn
         currentNode: coordinates of current node
         nextNode: coordinates of next node
         returns one of [0, 1, 2, 3]
     """
-    if nextNode[0] == currentNode[0]:  # x coordinates are equal
-        nextOrient = 0 if nextNode[1] > currentNode[1] else 2 #forward or backwards
-
-    else: #y coordinates are equal
-      nextOrient = 1 if nextNode[0] > currentNode[0] else 3 #left or right
-
-    return nextOrient
+    return getOrientation(currentNode, nextNode)
 
   def getTurn(self, currentOrient, nextOrient):
     """ get the turn angle depending on the change in orientation
@@ -117,6 +164,7 @@ class MazeSolver():
     """ Plot the maze, starting point, ending point
         Path and weights get filled in by astar vizualize function
     """
+    from matplotlib import patches, pyplot as plt #only loaded once plotting is asked for
     plt.clf()
     #plot maze
     for i in range(self.m.size):
@@ -153,46 +201,15 @@ class MazeSolver():
 
   def visualize(self, current):
     """ Plot the maze, starting point, ending point, and path using matplotlib
-        Shows a plot
+        the maze is drawn once, later calls only move the robot
+        current: coordinates of the robot
     """
-    plt.clf()
-    #plot maze
-    for i in range(self.m.size):
-      for j in range(self.m.size):
-        for n in self.m.graph[i][j].neighbors:
-          pd = 0.35
-          #vertical up from (i/n[0],j)
-          if i==n[0] and j < n[1]:
-            rectangle = patches.Rectangle((i-pd, j-pd), 2*pd, 1 + 2*pd, linewidth=0, fc ='w')
-          #vertical up from (i/n[0], n[1])
-          if i==n[0] and j > n[1]:
-            rectangle = patches.Rectangle((i-pd, n[1]-pd), 2*pd, 1 + 2*pd, linewidth=0, fc ='w')
-          #horizontal (i,j/n[1])
-          if j==n[1] and i < n[0]:
-            rectangle = patches.Rectangle((i-pd , j-pd), 1 + 2*pd, 2*pd, linewidth=0, fc ='w')
-          #horizontal (n[0],j/n[1])
-          if j==n[1] and i > n[0]:
-            rectangle = patches.Rectangle((n[0]-pd, j-pd), 1 + 2*pd, 2*pd, linewidth=0, fc ='w')
-          plt.gca().add_patch(rectangle)
-
-    #plot start and end dots
-    radius = float(self.m.size)/40
-    plt.axis([-1, self.m.size, -1, self.m.size])
-    begin=plt.Circle(self.start, radius, color='r')
-    end=plt.Circle(self.goal, radius,color='g')
-    location=plt.Circle(current, radius, color='k')
-    plt.gcf().gca().add_artist(begin)
-    plt.gcf().gca().add_artist(end)
-    plt.gcf().gca().add_artist(location)
-    plt.gca().set_axis_bgcolor('black')
-
-    #plot path
-    for i in range(len(self.path) -1):
-      x1, x2, y1, y2 = (self.path[i][0], self.path[i + 1][0], self.path[i][1], self.path[i + 1][1])
-      plt.plot([x1, x2], [y1, y2], 'red')
-
-    plt.show(False)
-    plt.pause(0.01)
+    from maze_renderer import MazeRenderer #only loaded once plotting is asked for
+    if self.renderer is None:
+      self.renderer = MazeRenderer(self.m.getBitmask(), self.start, self.goal)
+      self.renderer.setPath(self.path)
+    self.renderer.setLocation(current)
+    self.renderer.update()
 
 
 
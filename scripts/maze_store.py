@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+""" Keeps one copy of a maze in shared memory for every process on the host
+    the store is a file in /dev/shm mapped into each process, a header
+      magic, format, size, seed, version
+    followed by the size x size bitmask of Maze.getBitmask. Processes attach
+    to the same pages, so nothing is copied and a wall changed by one process
+    is seen by all the others. version is odd while a change is being written
+    and goes up by 2 with every change """
+
+import errno
+import fcntl
+import mmap
+import os
+import struct
+import tempfile
+import time
+import numpy as np
+from maze import STEPS, generateBitmask
+
+MAGIC = b'MAZESHM\0'
+FORMAT = 1
+HEADER = struct.Struct('<8sIIqQ') #magic, format, size, seed, version
+VERSION_OFFSET = HEADER.size - 8
+
+
+def getPath(name):
+  """ returns the file a store with this name lives in """
+  directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+  return os.path.join(directory, 'maze_store_%s' % name)
+
+
+class MazeStore(object):
+  """ A maze bitmask shared between processes, open it with create or attach """
+  def __init__(self, name, data, f):
+    """ use create or attach instead """
+    self.name = name
+    self.data = data
+    self.file = f
+    magic, form, self.size, seed, _ = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or form != FORMAT:
+      raise ValueError('%s is not a maze store' % getPath(name))
+    self.seed = None if seed < 0 else seed
+    #zero copy view of the shared pages
+    self.bitmask = np.ndarray((self.size, self.size), dtype=np.uint8, buffer=data, offset=HEADER.size)
+    self.version = np.ndarray((), dtype='<u8', buffer=data, offset=VERSION_OFFSET)
+
+  @classmethod
+  def create(cls, name, bitmask, seed=None, replace=False):
+    """ put a maze in shared memory
+        name: name other processes attach with
+        bitmask: 4 bit path signatures from Maze.getBitmask or generateBitmask
+        seed: seed the maze was generated from, if known
+        replace: overwrite a store that already has this name
+        returns the MazeStore
+    """
+    bitmask = np.asarray(bitmask, dtype=np.uint8)
+    path = getPath(name)
+    flags = os.O_RDWR | os.O_CREAT | (os.O_TRUNC if replace else os.O_EXCL)
+    fd = os.open(path, flags, 0o600)
+    f = os.fdopen(fd, 'r+b')
+    f.write(HEADER.pack(MAGIC, FORMAT, bitmask.shape[0], -1 if seed is None else seed, 0))
+    f.write(bitmask.tobytes())
+    f.flush()
+    return cls(name, mmap.mmap(f.fileno(), 0), f)
+
+  @classmethod
+  def attach(cls, name):
+    """ map an existing store into this process
+        returns the MazeStore, raises IOError/OSError when there is none
+    """
+    f = open(getPath(name), 'r+b')
+    return cls(name, mmap.mmap(f.fileno(), 0), f)
+
+  def getVersion(self):
+    """ returns the number of changes made so far times 2, odd while one is being written """
+    return int(self.version)
+
+  def read(self, timeout=1.0):
+    """ returns a consistent copy of the bitmask and its version, waiting out a change in progress
+        timeout: seconds to wait before raising IOError, a writer that died mid change leaves the version odd
+    """
+    deadline = time.time() + timeout
+    delay = 1e-5
+    while True:
+      before = self.getVersion()
+      copy = self.bitmask.copy()
+      if before % 2 == 0 and self.getVersion() == before:
+        return copy, before
+      if time.time() > deadline:
+        raise IOError('%s stayed at version %d for %.1f s' % (getPath(self.name), before, timeout))
+      time.sleep(delay)
+      delay = min(2*delay, .01)
+
+  def write(self, changes):
+    """ change nodes, every process sees the new paths once the version goes up
+        changes: list of ((i, j), signature)
+        returns the new version, raises ValueError before changing anything when a change is not valid
+    """
+    for (i, j), signature in changes:
+      if not (0 <= i < self.size and 0 <= j < self.size):
+        raise ValueError('node %s is outside the %d x %d maze' % ((i, j), self.size, self.size))
+      if not 0 <= signature < 16:
+        raise ValueError('signature %d of node %s is not 4 bits' % (signature, (i, j)))
+    fcntl.flock(self.file.fileno(), fcntl.LOCK_EX) #one writer at a time
+    try:
+      if self.getVersion() % 2: #the last writer died mid change, the lock went with it
+        self.version[()] += 1
+      self.version[()] += 1 #odd, readers retry
+      try:
+        for (i, j), signature in changes:
+          self.bitmask[i, j] = signature
+      finally:
+        self.version[()] += 1
+      return self.getVersion()
+    finally:
+      fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+  def setPath(self, node, orientation, isPath):
+    """ open or close the path from node in orientation, on both sides
+        returns the new version
+    """
+    dx, dy = STEPS[orientation]
+    other = (node[0] + dx, node[1] + dy)
+    if not (0 <= other[0] < self.size and 0 <= other[1] < self.size):
+      raise ValueError('no node beyond %s in orientation %d' % (node, orientation))
+    a, b = 1 << orientation, 1 << ((orientation + 2) % 4)
+    if isPath:
+      changes = [(node, self.bitmask[node] | a), (other, self.bitmask[other] | b)]
+    else:
+      changes = [(node, self.bitmask[node] & (15 & ~a)), (other, self.bitmask[other] & (15 & ~b))]
+    return self.write(changes)
+
+  def close(self):
+    """ detach this process, the store stays for the others """
+    self.bitmask = self.version = None
+    try:
+      self.data.close()
+    except BufferError: #views handed out are still alive, the mapping goes with them
+      pass
+    self.file.close()
+
+  def unlink(self):
+    """ remove the store, processes still attached keep their mapping """
+    try:
+      os.unlink(getPath(self.name))
+    except OSError as e:
+      if e.errno != errno.ENOENT:
+        raise
+
+
+if __name__ == '__main__':
+  import argparse
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('command', choices=['create', 'info', 'open', 'close', 'remove'])
+  parser.add_argument('name')
+  parser.add_argument('--size', type=int, default=10, help='size of a new maze')
+  parser.add_argument('--seed', type=int, default=0, help='seed of a new maze')
+  parser.add_argument('--node', type=int, nargs=2, help='node to open or close a path at')
+  parser.add_argument('--orientation', type=int, choices=range(4))
+  args = parser.parse_args()
+
+  if args.command == 'create':
+    store = MazeStore.create(args.name, generateBitmask(args.size, args.seed), args.seed)
+  else:
+    store = MazeStore.attach(args.name)
+  if args.command in ('open', 'close'):
+    store.setPath(tuple(args.node), args.orientation, args.command == 'open')
+  print('%s: size %d, seed %s, version %d' % (getPath(args.name), store.size, store.seed, store.getVersion()))
+  if args.command == 'remove':
+    store.unlink()
+  store.close()
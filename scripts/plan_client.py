@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+""" Talks to a plan_server over its Unix socket
+    every request and response is one line of JSON, requests carry an id that
+    the response echoes. Uses plain sockets so it runs under the Python 2 the
+    navigator runs with as well as Python 3 """
+
+import json
+import os
+import socket
+import tempfile
+import threading
+from maze_solver import MazeSolver
+
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), 'maze_planner.sock')
+
+
+def getCostParameters(costModel):
+  """ returns the parameters of a TraversalCostModel as sent to the server, None for the default weights """
+  if costModel is None:
+    return None
+  return {'nodeDistance': costModel.nodeDistance, 'linearSpeed': costModel.linearSpeed,
+          'angularSpeed': costModel.angularSpeed, 'settleTime': costModel.settleTime}
+
+
+class PlanClient(object):
+  """ A connection to a plan server, safe to share between threads """
+  def __init__(self, path=DEFAULT_PATH, timeout=10.0):
+    """ path: Unix socket the server listens on
+        timeout: seconds to wait for a response before raising socket.timeout
+    """
+    self.path = path
+    self.timeout = timeout
+    self.sock = self.file = None
+    self.lock = threading.Lock()
+    self.nextId = 0
+    self.connect()
+
+  def connect(self):
+    self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    self.sock.settimeout(self.timeout)
+    self.sock.connect(self.path)
+    self.file = self.sock.makefile('rb')
+
+  def disconnect(self):
+    """ drop the connection, a late answer to an abandoned request can then never be read as the next one's """
+    if self.file:
+      self.file.close()
+    if self.sock:
+      self.sock.close()
+    self.sock = self.file = None
+
+  def request(self, op, **fields):
+    """ send a request and wait for its response, reconnecting first if an earlier request failed
+        returns the response dict, raises ValueError when the server reports an error
+        and IOError (socket.timeout included) when the server cannot be reached or does not answer in time
+    """
+    with self.lock:
+      self.nextId += 1
+      fields.update(op=op, id=self.nextId)
+      try:
+        if not self.sock:
+          self.connect()
+        self.sock.sendall((json.dumps(fields) + '\n').encode())
+        while True:
+          line = self.file.readline()
+          if not line:
+            raise IOError('plan server closed the connection')
+          response = json.loads(line.decode())
+          if response.get('id') == self.nextId: #skip answers to requests that were given up on
+            break
+      except (IOError, OSError):
+        self.disconnect()
+        raise
+    if 'error' in response:
+      raise ValueError(response['error'])
+    return response
+
+  def load(self, name, size=None, seed=None, store=None, filename=None, bitmask=None):
+    """ have the server hold a maze, give one of
+        size and seed: generate it with generateBitmask
+        store: name of a MazeStore, followed as other processes change it
+        filename: .npy bitmask on this host
+        bitmask: 4 bit path signatures from Maze.getBitmask
+        returns the response with the maze size and version
+    """
+    return self.request('load', name=name, size=size, seed=seed, store=store, filename=filename,
+                        bitmask=None if bitmask is None else [[int(s) for s in row] for row in bitmask])
+
+  def plan(self, name, start, goal, orientation=0, costModel=None):
+    """ returns the server's plan through a loaded maze as a dict with path,
+        instructions and runs, None when the goal cannot be reached
+        orientation: orientation of the robot at the start, one of [0, 1, 2, 3]
+        costModel: TraversalCostModel to plan with, the default weights when None
+    """
+    response = self.request('plan', maze=name, start=list(start), goal=list(goal), orientation=orientation,
+                            cost=getCostParameters(costModel))
+    return response if response['path'] is not None else None
+
+  def getSolver(self, maze, name, start, goal, orientation=0, costModel=None):
+    """ returns a MazeSolver for the server's plan, None when the goal cannot be reached
+        maze: the local Maze the server's maze called name was loaded from
+    """
+    response = self.plan(name, start, goal, orientation, costModel)
+    return MazeSolver.fromPath(maze, response['path'], orientation) if response else None
+
+  def getStats(self):
+    """ returns the server's counters """
+    return self.request('stats')
+
+  def close(self):
+    self.disconnect()
+
+
+if __name__ == '__main__':
+  import argparse
+  import random
+  import time
+  parser = argparse.ArgumentParser(description='load a maze into a plan server and time plans from several clients')
+  parser.add_argument('--path', default=DEFAULT_PATH)
+  parser.add_argument('--size', type=int, default=50)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--clients', type=int, default=8)
+  parser.add_argument('--plans', type=int, default=100, help='plans per client')
+  args = parser.parse_args()
+
+  PlanClient(args.path).load('benchmark', size=args.size, seed=args.seed)
+
+  def work(k):
+    client = PlanClient(args.path)
+    rand = random.Random(k)
+    for _ in range(args.plans):
+      goal = (rand.randrange(args.size), rand.randrange(args.size))
+      client.plan('benchmark', (0, 0), goal)
+    client.close()
+
+  start = time.time()
+  threads = [threading.Thread(target=work, args=(k,)) for k in range(args.clients)]
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join()
+  elapsed = time.time() - start
+  print('%d plans from %d clients in %.2f s, %.0f plans/s' % (args.clients*args.plans, args.clients, elapsed,
+                                                             args.clients*args.plans / elapsed))
+  stats = PlanClient(args.path).getStats()
+  for key in sorted(set(stats) - set(['id'])):
+    print('%-22s %s' % (key, stats[key]))
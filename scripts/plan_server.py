@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+
+""" Long running planning service on a Unix socket, needs Python 3 for asyncio
+    mazes stay loaded between requests, so consumers do not each generate a
+    maze and build a MazeSolver. Plan requests for the same maze that arrive
+    while one is being waited on are gathered into a batch, repeated queries in
+    a batch are solved once, and answers are cached per maze version. Requests
+    and responses are lines of JSON, see plan_client.PlanClient """
+
+import asyncio
+import collections
+import concurrent.futures
+import json
+import os
+import time
+import numpy as np
+from cost_model import TraversalCostModel
+from maze import Maze, generateBitmask
+from maze_solver import MazeSolver
+from maze_store import MazeStore
+from plan_client import DEFAULT_PATH
+
+
+class LoadedMaze(object):
+  """ A maze held by the server and the plan requests waiting on it """
+  def __init__(self, load, bitmask, store=None):
+    """ load: number of the load that brought the maze, tells apart mazes loaded under the same name
+        bitmask: 4 bit path signatures
+        store: MazeStore the bitmask was read from, checked for changes before each batch
+    """
+    self.load = load
+    self.store = store
+    self.version = 0
+    self.pending = [] #(query, future) waiting for the next batch
+    self.batches = 0 #batches started and not finished
+    self.replaced = False #another maze was loaded under the name
+    self.setBitmask(bitmask)
+
+  def setBitmask(self, bitmask):
+    self.bitmask = np.asarray(bitmask, dtype=np.uint8)
+    self.maze = Maze.fromBitmask(self.bitmask)
+
+  def refresh(self):
+    """ reload the maze if another process changed the store """
+    if self.store and self.store.getVersion() != self.version:
+      bitmask, self.version = self.store.read()
+      self.setBitmask(bitmask)
+
+  def closeIfDone(self):
+    """ detach from the store once the maze is replaced and no batch can read it anymore """
+    if self.replaced and not self.batches and self.store:
+      self.store.close()
+      self.store = None
+
+
+class PlanServer(object):
+  """ Serves plans through loaded mazes """
+  def __init__(self, path=DEFAULT_PATH, window=.002, cacheSize=10000, latencies=10000):
+    """ path: Unix socket to listen on
+        window: seconds a batch waits for more requests after its first one
+        cacheSize: most plans kept for repeated queries
+        latencies: number of recent request latencies kept for the percentiles
+    """
+    self.path = path
+    self.window = window
+    self.cacheSize = cacheSize
+    self.mazes = {} #name: LoadedMaze
+    self.costModels = {} #parameters: TraversalCostModel
+    self.cache = collections.OrderedDict() #(load, version, query): plan, least recently used first
+    self.executor = concurrent.futures.ThreadPoolExecutor(1) #searches run here, off the event loop
+    self.counters = collections.Counter()
+    self.latencies = collections.deque(maxlen=latencies)
+    self.started = time.time()
+
+  def load(self, request):
+    """ hold a maze under a name, from a seed, a MazeStore, a .npy file or a bitmask """
+    store = None
+    if request.get('store'):
+      store = MazeStore.attach(request['store'])
+      bitmask, version = store.read()
+    elif request.get('filename'):
+      bitmask = np.load(request['filename'])
+    elif request.get('bitmask') is not None:
+      bitmask = request['bitmask']
+    elif request.get('size'):
+      bitmask = generateBitmask(request['size'], request.get('seed'))
+    else:
+      raise ValueError('load needs a store, filename, bitmask or size')
+    old = self.mazes.get(request['name'])
+    if old: #batches already queued on it still finish with it
+      old.replaced = True
+      old.closeIfDone()
+    self.counters['loads'] += 1
+    entry = self.mazes[request['name']] = LoadedMaze(self.counters['loads'], bitmask, store)
+    if store:
+      entry.version = version
+    return {'size': int(entry.bitmask.shape[0]), 'version': entry.version}
+
+  def getCostModel(self, parameters):
+    if parameters is None:
+      return None
+    key = tuple(sorted(parameters.items()))
+    if key not in self.costModels:
+      self.costModels[key] = TraversalCostModel(**parameters)
+    return self.costModels[key]
+
+  async def plan(self, request):
+    """ queue a plan on the maze's next batch and wait for it """
+    name = request['maze']
+    if name not in self.mazes:
+      raise ValueError('no maze called %s is loaded' % name)
+    entry = self.mazes[name]
+    size = entry.bitmask.shape[0]
+    for key in ('start', 'goal'): #negative indices would wrap around the maze
+      node = request[key]
+      if len(node) != 2 or not all(0 <= k < size for k in node):
+        raise ValueError('%s %s is outside the %d x %d maze' % (key, node, size, size))
+    if request.get('orientation', 0) not in range(4):
+      raise ValueError('orientation %s is not one of 0, 1, 2, 3' % request['orientation'])
+    cost = request.get('cost')
+    query = (tuple(request['start']), tuple(request['goal']), request.get('orientation', 0),
+             tuple(sorted(cost.items())) if cost else None)
+    future = asyncio.get_running_loop().create_future()
+    entry.pending.append((query, future))
+    if len(entry.pending) == 1: #first of a batch
+      entry.batches += 1
+      asyncio.ensure_future(self.runBatch(entry))
+    return await future
+
+  async def runBatch(self, entry):
+    """ wait out the window, then solve everything that came in meanwhile on the worker thread """
+    await asyncio.sleep(self.window)
+    batch, entry.pending = entry.pending, []
+    try:
+      plans = await asyncio.get_running_loop().run_in_executor(self.executor, self.solveBatch, entry,
+                                                            [query for query, _ in batch])
+    except Exception as e:
+      for _, future in batch:
+        future.set_exception(e)
+      return
+    finally:
+      entry.batches -= 1
+      entry.closeIfDone()
+    self.counters['batches'] += 1
+    self.counters['batched requests'] += len(batch)
+    for query, future in batch:
+      if isinstance(plans[query], Exception): #only the requests with this query fail
+        future.set_exception(plans[query])
+      else:
+        future.set_result(plans[query])
+
+  def solveBatch(self, entry, queries):
+    """ returns {query: plan} solving each different query once, runs on the worker thread
+        a query that fails gets its exception instead of a plan, so it cannot fail the rest of the batch
+    """
+    entry.refresh()
+    plans = {}
+    for query in set(queries):
+      key = (entry.load, entry.version, query)
+      if key in self.cache:
+        self.cache[key] = plans[query] = self.cache.pop(key) #most recently used
+        self.counters['cache hits'] += 1
+        continue
+      start, goal, orientation, cost = query
+      try:
+        solver = MazeSolver(maze=entry.maze, start=start, goal=goal, orientation=orientation,
+                            costModel=self.getCostModel(dict(cost) if cost else None))
+        plans[query] = {'path': solver.path, 'instructions': solver.instructions, 'runs': solver.getRuns(),
+                        'cost': solver.a.cost}
+      except KeyError: #goal cannot be reached
+        plans[query] = {'path': None}
+      except Exception as e:
+        plans[query] = e #reported to the requests with this query, not cached
+        continue
+      self.counters['plans'] += 1
+      self.cache[key] = plans[query]
+      if len(self.cache) > self.cacheSize:
+        self.cache.popitem(last=False)
+    return plans
+
+  def getStats(self):
+    """ returns throughput and latency counters """
+    uptime = time.time() - self.started
+    latencies = np.array(self.latencies) * 1000
+    stats = dict(self.counters)
+    stats.update({'uptime seconds': uptime,
+                  'requests per second': self.counters['requests'] / uptime,
+                  'mazes': sorted(self.mazes),
+                  'mean batch size': self.counters['batched requests'] / float(max(self.counters['batches'], 1))})
+    if latencies.size:
+      stats.update({'latency ms p50': float(np.percentile(latencies, 50)),
+                    'latency ms p95': float(np.percentile(latencies, 95)),
+                    'latency ms max': float(latencies.max())})
+    return stats
+
+  async def respond(self, line, writer):
+    """ answer one request line """
+    start = time.time()
+    request = {}
+    try:
+      request = json.loads(line.decode())
+      op = request.get('op')
+      if op == 'plan':
+        response = await self.plan(request)
+      elif op == 'load':
+        response = self.load(request)
+      elif op == 'stats':
+        response = self.getStats()
+      else:
+        raise ValueError('unknown op %s' % op)
+    except Exception as e: #reported to the client, the server keeps going
+      response = {'error': '%s: %s' % (type(e).__name__, e)}
+      self.counters['errors'] += 1
+    response = dict(response, id=request.get('id'))
+    writer.write((json.dumps(response) + '\n').encode())
+    self.counters['requests'] += 1
+    self.latencies.append(time.time() - start)
+
+  async def handle(self, reader, writer):
+    """ serve one connection, requests on it are answered as they complete """
+    self.counters['connections'] += 1
+    tasks = set() #requests not answered yet
+    while True:
+      line = await reader.readline()
+      if not line:
+        break
+      task = asyncio.ensure_future(self.respond(line, writer))
+      tasks.add(task)
+      task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks) #a client that half-closes still gets its answers
+    writer.close()
+
+  async def serve(self):
+    if os.path.exists(self.path):
+      os.unlink(self.path) #left by a server that did not shut down
+    server = await asyncio.start_unix_server(self.handle, path=self.path)
+    async with server:
+      await server.serve_forever()
+
+
+if __name__ == '__main__':
+  import argparse
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--path', default=DEFAULT_PATH)
+  parser.add_argument('--window', type=float, default=.002, help='seconds a batch waits for more requests')
+  args = parser.parse_args()
+  try:
+    asyncio.run(PlanServer(args.path, args.window).serve())
+  except KeyboardInterrupt:
+    pass
+  finally:
+    if os.path.exists(args.path):
+      os.unlink(args.path)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+""" Plans new paths on a worker thread while the robot keeps driving the old one
+    a request names the node of the current path the new plan should start
+    from, normally the next node the robot reaches, and the orientation the
+    robot will have there. The navigator takes the plan when it gets to that
+    node, so the robot never stops to wait for A* """
+
+import threading
+import time
+import rospy
+from maze_solver import MazeSolver
+
+
+class BackgroundPlanner(object):
+  """ Solves the latest goal change or replan request in the background, older requests are dropped """
+  def __init__(self, maze, costModel=None, client=None, name=None):
+    """ maze: Maze to plan in until a request brings a new one
+        costModel: TraversalCostModel the paths are planned with
+        client: optional PlanClient to have a plan server do the searching
+        name: name the server holds the maze under
+    """
+    self.maze = maze
+    self.costModel = costModel
+    self.client = client
+    self.name = name
+    self.ready = threading.Condition()
+    self.pending = None #(index, start, orientation, goal, maze) waiting to be planned
+    self.plan = None #(index, MazeSolver) planned and not taken yet
+    self.planned = 0 #number of plans made
+    self.seconds = 0.0 #time spent planning
+
+    self.thread = threading.Thread(target=self.run)
+    self.thread.daemon = True
+    self.thread.start()
+
+  def request(self, index, start, orientation, goal, maze=None):
+    """ queue a plan, returns immediately
+        index: index in the current path of the node the plan starts from
+        start: that node
+        orientation: orientation of the robot at the node, one of [0, 1, 2, 3]
+        goal: node to get to
+        maze: Maze whose walls changed, if any
+    """
+    with self.ready:
+      if maze:
+        self.maze = maze
+      self.pending = (index, start, orientation, goal, self.maze)
+      self.plan = None #made for an older request
+      self.ready.notify()
+
+  def isBusy(self):
+    """ returns True while a request is waiting or being planned """
+    with self.ready:
+      return self.pending is not None
+
+  def take(self):
+    """ returns (index, MazeSolver) of the latest plan and forgets it, None if there is none """
+    with self.ready:
+      plan, self.plan = self.plan, None
+      return plan
+
+  def run(self):
+    """ wait for requests and plan them """
+    while True:
+      with self.ready:
+        while self.pending is None:
+          self.ready.wait()
+        pending = self.pending
+
+      index, start, orientation, goal, maze = pending
+      t = time.time()
+      solver = None #a failed plan leaves the old one driving
+      try:
+        if self.client: #the server follows changes to the maze itself
+          solver = self.client.getSolver(maze, self.name, start, goal, orientation, self.costModel)
+        else:
+          solver = MazeSolver(costModel=self.costModel, maze=maze, start=start, goal=goal, orientation=orientation)
+      except KeyError: #no path to the goal
+        pass
+      except Exception as e: #server gone or refused, or the search failed, the thread must live on
+        rospy.logwarn('no plan from %s to %s: %s: %s' % (start, goal, type(e).__name__, e))
+      finally:
+        with self.ready:
+          self.planned += 1
+          self.seconds += time.time() - t
+          if self.pending is pending: #otherwise a newer request came in meanwhile
+            self.plan = (index, solver) if solver else None
+            self.pending = None
@@ -0,0 +1,117 @@
+import math
+import numpy as np
+
+
+class MazeRaycaster(object):
+  """ Casts virtual laser beams through the maze from a continuous pose
+      the maze frame has node (0, 0) at the origin, nodes are nodeDistance apart
+      and headings are measured from +x (orientation 1) counterclockwise
+
+      every node is a free square of half width wallDistance, joined to its
+      neighbors by corridors of the same width. Along each axis a node cell is
+      split into 3 bands (wall margin, corridor, wall margin), which gives a
+      3*size x 3*size block grid that rays walk through with a grid DDA
+  """
+  def __init__(self, bitmask, nodeDistance=.8, wallDistance=.3, maxDistance=.6):
+    """ bitmask: output of Maze.getBitmask
+        nodeDistance: distance between nodes
+        wallDistance: distance from a node center to its walls
+        maxDistance: beams that travel further than this return 0
+    """
+    self.size = bitmask.shape[0]
+    self.nodeDistance = nodeDistance
+    self.wallDistance = wallDistance
+    self.maxDistance = maxDistance
+    self.angles = {} #cached (cos, sin) beam tables by beam count
+
+    #band edges along either axis, node i is centered on i*nodeDistance
+    #an extra wall block on each end keeps rays inside the grid
+    centers = np.arange(self.size) * nodeDistance
+    half = nodeDistance / 2.0
+    edges = np.empty(3*self.size + 3)
+    edges[1:-2:3] = centers - half
+    edges[2:-1:3] = centers - wallDistance
+    edges[3::3] = centers + wallDistance
+    edges[0] = edges[1] - half
+    edges[-2] = centers[-1] + half
+    edges[-1] = edges[-2] + half
+    self.edges = edges
+
+    #free blocks: node centers plus the margins that open onto a path
+    free = np.zeros((3*self.size + 2, 3*self.size + 2), dtype=bool)
+    inner = free[1:-1, 1:-1]
+    inner[1::3, 1::3] = True
+    inner[1::3, 2::3] = bitmask & 1 > 0 #+y
+    inner[2::3, 1::3] = bitmask & 2 > 0 #+x
+    inner[1::3, 0::3] = bitmask & 4 > 0 #-y
+    inner[0::3, 1::3] = bitmask & 8 > 0 #-x
+    self.free = free
+
+  def getAngles(self, beams):
+    """ returns cached (cos, sin) arrays of the beam angles relative to the robot
+        beam k points 2*pi*k/beams counterclockwise from the robot's heading
+    """
+    if beams not in self.angles:
+      angles = np.arange(beams) * (2*math.pi / beams)
+      self.angles[beams] = (np.cos(angles), np.sin(angles))
+    return self.angles[beams]
+
+  def cast(self, x, y, theta, beams=360):
+    """ get 'laser scan' ranges seen from a continuous pose in the maze frame
+        x, y: robot position in meters
+        theta: robot heading in radians
+        beams: number of evenly spaced beams
+        returns a numpy array of length beams, 0 where nothing is hit
+    """
+    ranges = np.zeros(beams)
+    n = self.free.shape[0]
+    kx = np.searchsorted(self.edges, x, 'right') - 1
+    ky = np.searchsorted(self.edges, y, 'right') - 1
+    if not (0 <= kx < n and 0 <= ky < n) or not self.free[kx, ky]:
+      return ranges #outside of the maze or inside a wall
+
+    c, s = self.getAngles(beams)
+    cosT, sinT = math.cos(theta), math.sin(theta)
+    dx = c*cosT - s*sinT #beam directions in the maze frame
+    dy = s*cosT + c*sinT
+
+    nextX = (dx > 0).astype(int) #offset from block index to the edge ahead
+    nextY = (dy > 0).astype(int)
+    stepX = 2*nextX - 1
+    stepY = 2*nextY - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+      invX = 1.0 / dx
+      invY = 1.0 / dy
+      tMaxX = (self.edges[kx + nextX] - x) * invX #distance to the next edge crossing
+      tMaxY = (self.edges[ky + nextY] - y) * invY
+    tMaxX[dx == 0] = np.inf
+    tMaxY[dy == 0] = np.inf
+
+    idx = np.arange(beams)
+    bx = np.full(beams, kx)
+    by = np.full(beams, ky)
+    free = self.free.ravel()
+
+    while idx.size:
+      useX = tMaxX < tMaxY
+      useY = ~useX
+      t = np.where(useX, tMaxX, tMaxY)
+      bx[useX] += stepX[useX]
+      by[useY] += stepY[useY]
+
+      hit = ~free[bx*n + by]
+      far = t > self.maxDistance #beyond maxDistance stays 0
+      done = hit & ~far
+      ranges[idx[done]] = t[done]
+
+      keep = ~(hit | far)
+      idx, bx, by, useX, useY = idx[keep], bx[keep], by[keep], useX[keep], useY[keep]
+      stepX, stepY, invX, invY = stepX[keep], stepY[keep], invX[keep], invY[keep]
+      nextX, nextY = nextX[keep], nextY[keep]
+      tMaxX, tMaxY = tMaxX[keep], tMaxY[keep]
+
+      #move the crossed axis on to its next edge
+      tMaxX[useX] = (self.edges[bx[useX] + nextX[useX]] - x) * invX[useX]
+      tMaxY[useY] = (self.edges[by[useY] + nextY[useY]] - y) * invY[useY]
+
+    return ranges
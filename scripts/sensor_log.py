@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+
+""" Records the /scan and /odom messages MazeNavigator receives and replays them
+    the log is a binary, append-only file that is read through mmap:
+      file header: magic, version
+      records: kind, payload size, receive time, message stamp, payload
+    scan payloads are angle_min, angle_increment, range_min, range_max and the
+    ranges as float32, odom payloads are the pose and twist as float64, the
+    state payload is the random state the maze was generated from and the
+    config payload the maze, goal and settings the navigator drove with """
+
+import mmap
+import os
+import pickle
+import random
+import struct
+import threading
+import time
+import numpy as np
+
+MAGIC = b'MAZELOG\0'
+VERSION = 1
+FILE_HEADER = struct.Struct('<8sI')
+RECORD_HEADER = struct.Struct('<B3xIdd') #kind, payload bytes, receive time, message stamp
+SCAN_HEADER = struct.Struct('<4f')
+ODOM = struct.Struct('<13d') #position, orientation, linear and angular twist
+
+STATE, SCAN, ODOM_KIND, CONFIG = 0, 1, 2, 3
+KIND_NAMES = {STATE: 'state', SCAN: 'scan', ODOM_KIND: 'odom', CONFIG: 'config'}
+
+
+class SensorRecorder(object):
+  """ Appends sensor messages to a log file, safe to call from several callback threads """
+  def __init__(self, path, clock=time.time):
+    """ path: log file, a new one is started or an existing one appended to
+        clock: returns the receive time of a message in seconds
+    """
+    self.path = path
+    self.clock = clock
+    self.lock = threading.Lock()
+    self.records = 0
+    self.file = open(path, 'ab')
+    if self.file.tell() == 0:
+      self.file.write(FILE_HEADER.pack(MAGIC, VERSION))
+
+  def write(self, kind, stamp, payload):
+    """ append one record, flushed so a crash loses at most the record being written """
+    header = RECORD_HEADER.pack(kind, len(payload), self.clock(), stamp)
+    with self.lock:
+      self.file.write(header + payload)
+      self.file.flush()
+      self.records += 1
+
+  def recordState(self):
+    """ save the state of random, call it just before the maze is generated
+        so that a replay can build the same maze
+    """
+    self.write(STATE, 0.0, pickle.dumps(random.getstate(), 2))
+
+  def recordConfig(self, config):
+    """ save how the navigator is set up, a replay builds its navigator from the last one
+        config: dict of plain Python values, from MazeNavigator.getConfig
+    """
+    self.write(CONFIG, 0.0, pickle.dumps(config, 2))
+
+  def recordScan(self, data):
+    """ data: LaserScan message """
+    ranges = np.asarray(data.ranges, dtype='<f4')
+    payload = SCAN_HEADER.pack(data.angle_min, data.angle_increment, data.range_min, data.range_max)
+    self.write(SCAN, data.header.stamp.to_sec(), payload + ranges.tobytes())
+
+  def recordOdom(self, data):
+    """ data: Odometry message """
+    p = data.pose.pose.position
+    q = data.pose.pose.orientation
+    l = data.twist.twist.linear
+    a = data.twist.twist.angular
+    payload = ODOM.pack(p.x, p.y, p.z, q.x, q.y, q.z, q.w, l.x, l.y, l.z, a.x, a.y, a.z)
+    self.write(ODOM_KIND, data.header.stamp.to_sec(), payload)
+
+  def close(self):
+    with self.lock:
+      self.file.close()
+
+
+class SensorLog(object):
+  """ Read only view of a log through mmap, scan ranges are not copied """
+  def __init__(self, path):
+    """ path: log file written by SensorRecorder
+        a record cut short by a crash at the end of the file is ignored
+    """
+    self.path = path
+    with open(path, 'rb') as f:
+      size = os.fstat(f.fileno()).st_size
+      if size < FILE_HEADER.size:
+        raise ValueError('%s is not a sensor log' % path)
+      self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version = FILE_HEADER.unpack_from(self.data, 0)
+    if magic != MAGIC or version != VERSION:
+      raise ValueError('%s is not a version %d sensor log' % (path, VERSION))
+
+    #index every record: kind, payload offset, payload bytes, receive time, stamp
+    kinds, offsets, sizes, received, stamps = [], [], [], [], []
+    offset = FILE_HEADER.size
+    while offset + RECORD_HEADER.size <= size:
+      kind, length, receive, stamp = RECORD_HEADER.unpack_from(self.data, offset)
+      offset += RECORD_HEADER.size
+      if offset + length > size:
+        break
+      kinds.append(kind)
+      offsets.append(offset)
+      sizes.append(length)
+      received.append(receive)
+      stamps.append(stamp)
+      offset += length
+    self.kinds = np.array(kinds, dtype=np.uint8)
+    self.offsets = np.array(offsets, dtype=np.int64)
+    self.sizes = np.array(sizes, dtype=np.int64)
+    self.received = np.array(received)
+    self.stamps = np.array(stamps)
+
+  def __len__(self):
+    return self.kinds.size
+
+  def randomState(self):
+    """ returns the random state saved before the maze was generated, or None """
+    for k in np.flatnonzero(self.kinds == STATE)[:1]:
+      offset = int(self.offsets[k])
+      return pickle.loads(self.data[offset:offset + int(self.sizes[k])])
+    return None
+
+  def config(self):
+    """ returns the last navigator configuration saved, or None for logs that have none """
+    for k in np.flatnonzero(self.kinds == CONFIG)[-1:]:
+      offset = int(self.offsets[k])
+      return pickle.loads(self.data[offset:offset + int(self.sizes[k])])
+    return None
+
+  def scan(self, k):
+    """ returns angle_min, angle_increment, range_min, range_max and a float32 view of the ranges of record k """
+    offset = int(self.offsets[k])
+    header = SCAN_HEADER.unpack_from(self.data, offset)
+    count = (int(self.sizes[k]) - SCAN_HEADER.size) // 4
+    ranges = np.frombuffer(self.data, dtype='<f4', count=count, offset=offset + SCAN_HEADER.size)
+    return header + (ranges,)
+
+  def odom(self, k):
+    """ returns the 13 pose and twist values of record k """
+    return ODOM.unpack_from(self.data, int(self.offsets[k]))
+
+  def summary(self):
+    """ returns a dict of record counts, duration and average rates """
+    duration = self.received[-1] - self.received[0] if len(self) > 1 else 0.0
+    info = {'records': len(self), 'bytes': int(self.offsets[-1] + self.sizes[-1]) if len(self) else 0,
+            'duration': duration}
+    for kind, name in KIND_NAMES.items():
+      count = int(np.sum(self.kinds == kind))
+      info[name + ' records'] = count
+      if kind in (SCAN, ODOM_KIND) and duration > 0:
+        info[name + ' rate'] = count / duration
+    return info
+
+
+class LogReplay(object):
+  """ Feeds a log through MazeNavigator's callbacks with the maze_sim stand-ins in place of ROS
+      the robot is not simulated, the recorded odometry drives the navigator
+  """
+  def __init__(self, log, realtime=False, eventDriven=False, continuousScan=True, control=True):
+    """ log: SensorLog to replay
+        realtime: keep the original timing instead of replaying as fast as possible
+        eventDriven: run the navigator's event driven control instead of its 5Hz loop
+        continuousScan: let the navigator cast its maze scan from the odometry pose
+        control: also run control updates, otherwise only the callbacks
+    """
+    self.log = log
+    self.realtime = realtime
+    self.eventDriven = eventDriven
+    self.continuousScan = continuousScan
+    self.control = control
+
+    self.now = log.received[0] if len(log) else 0.0
+    self.done = False
+    self.thread = threading.current_thread()
+    self.subscribers = {} #topic: list of callbacks
+    self.published = {} #topic: number of messages
+    self.next = 0 #next record to deliver
+    self.callbackTime = {'/scan': 0.0, '/odom': 0.0} #wall seconds spent in each callback
+    self.delivered = {'/scan': 0, '/odom': 0}
+    self.runs = [] #(turn, nodes, seconds) of every run the navigator finished, for TraversalCostModel.calibrate
+
+  def receive(self, topic, msg):
+    """ handle a message published by the navigator """
+    self.published[topic] = self.published.get(topic, 0) + 1
+
+  def message(self, k):
+    """ returns the topic and stand-in message of record k """
+    import maze_sim as sim
+    header = sim.Header(stamp=sim.Time(self.log.stamps[k]))
+    if self.log.kinds[k] == SCAN:
+      angleMin, increment, rangeMin, rangeMax, ranges = self.log.scan(k)
+      header.frame_id = 'base_laser_link'
+      return '/scan', sim.LaserScan(header=header, angle_min=angleMin, angle_increment=increment,
+                                    angle_max=angleMin + increment*(ranges.size - 1),
+                                    range_min=rangeMin, range_max=rangeMax, ranges=tuple(ranges.tolist()))
+    v = self.log.odom(k)
+    header.frame_id = 'odom'
+    pose = sim.Pose(position=sim.Point(x=v[0], y=v[1], z=v[2]),
+                    orientation=sim.Quaternion(x=v[3], y=v[4], z=v[5], w=v[6]))
+    twist = sim.Twist(linear=sim.Vector3(x=v[7], y=v[8], z=v[9]), angular=sim.Vector3(x=v[10], y=v[11], z=v[12]))
+    return '/odom', sim.Odometry(header=header, child_frame_id='base_link', pose=sim.PoseWithCovariance(pose=pose),
+                                 twist=sim.TwistWithCovariance(twist=twist))
+
+  def advance(self, duration):
+    """ move replay time forward, delivering the records that fall due """
+    end = self.now + duration
+    received, kinds = self.log.received, self.log.kinds
+    while self.next < len(self.log) and received[self.next] <= end:
+      k = self.next
+      self.next += 1
+      if kinds[k] in (STATE, CONFIG):
+        continue
+      if self.realtime:
+        lag = received[k] - self.now - (time.time() - self.wallStart)
+        if lag > 0:
+          time.sleep(lag)
+      topic, msg = self.message(k)
+      start = time.time()
+      for callback in self.subscribers.get(topic, []):
+        callback(msg)
+      self.callbackTime[topic] += time.time() - start
+      self.delivered[topic] += 1
+    self.now = end
+    self.wallStart = time.time() #real time resumes from here
+
+  def run(self):
+    """ build a navigator on the recorded maze and replay the whole log
+        returns a dict of throughput statistics
+    """
+    import maze_sim as sim
+    sim.installStandIns()
+    from maze_robot import MazeNavigator
+    from maze import Maze
+    from chunked_maze import ChunkedMaze
+    from cost_model import TraversalCostModel
+
+    state = self.log.randomState()
+    if state is not None:
+      random.setstate(state)
+    sim.active = self
+    config = self.log.config()
+    if config: #the recorded maze, goal and settings, even when the maze came from a store
+      if 'chunked' in config:
+        maze = ChunkedMaze(**config['chunked'])
+      else:
+        maze = Maze.fromBitmask(np.array(config['bitmask'], dtype=np.uint8))
+      navigator = MazeNavigator(viz=False, maze=maze, goal=tuple(config['goal']), costModel=TraversalCostModel(**config['costModel']))
+      navigator.mergeStraight = config['mergeStraight']
+    else: #older logs, the random state generates the same maze
+      navigator = MazeNavigator(viz=False)
+    navigator.eventDriven = self.eventDriven
+    navigator.continuousScan = self.continuousScan
+
+    period = 1.0 / navigator.maxRate if self.eventDriven else .2 #the 5Hz loop
+    steps = 0
+    controlTime = 0.0
+    running = True
+    runI, runStart = 0, self.now
+    start = self.wallStart = time.time()
+    try:
+      self.advance(0)
+      while self.next < len(self.log):
+        if self.control and running and (not self.eventDriven or navigator.controlPending):
+          navigator.controlPending = False
+          t = time.time()
+          running = navigator.controlStep() if self.eventDriven else navigator.pollStep()
+          controlTime += time.time() - t
+          steps += 1
+          if navigator.runI != runI: #a run ended
+            run = navigator.runs[runI]
+            self.runs.append((run[0], run[3], self.now - runStart))
+            runI, runStart = navigator.runI, self.now
+        self.advance(period)
+    finally:
+      self.done = True
+      sim.active = None
+    elapsed = time.time() - start
+
+    stats = {'wall seconds': elapsed,
+             'log seconds': self.log.summary()['duration'],
+             'control steps': steps,
+             'control ms mean': 1000 * controlTime / steps if steps else float('nan'),
+             'instructions performed': navigator.currentI,
+             'commands': self.published.get('/cmd_vel', 0)}
+    for topic in ('/scan', '/odom'):
+      count = self.delivered[topic]
+      stats[topic + ' messages'] = count
+      stats[topic + ' callback ms mean'] = 1000 * self.callbackTime[topic] / count if count else float('nan')
+    stats['messages per second'] = sum(self.delivered.values()) / elapsed if elapsed else float('nan')
+    return stats
+
+
+if __name__ == '__main__':
+  import argparse
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('command', choices=['info', 'replay'])
+  parser.add_argument('log')
+  parser.add_argument('--realtime', action='store_true', help='keep the original timing')
+  parser.add_argument('--event-driven', action='store_true')
+  parser.add_argument('--node-scan', action='store_true', help='project the maze scan from node centers')
+  parser.add_argument('--callbacks-only', action='store_true', help='skip the control updates')
+  args = parser.parse_args()
+
+  log = SensorLog(args.log)
+  if args.command == 'info':
+    stats = log.summary()
+  else:
+    stats = LogReplay(log, args.realtime, args.event_driven, not args.node_scan, not args.callbacks_only).run()
+  for key in sorted(stats):
+    print('%-34s %s' % (key, stats[key]))
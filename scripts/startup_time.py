@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+""" Measures how long the navigator's modules take to import and set up
+    every measurement runs in a fresh interpreter so nothing is cached between
+    them, and reports whether matplotlib got loaded along the way. maze_robot is
+    imported with the maze_sim stand-ins in place of rospy and tf, so the cost of
+    the ROS client libraries themselves is not included """
+
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+
+#name: (setup that is not timed, statement that is timed)
+TARGETS = [
+  ('numpy', ('', 'import numpy')),
+  ('maze', ('', 'import maze')),
+  ('astar', ('', 'import astar')),
+  ('maze_solver', ('', 'import maze_solver')),
+  ('raycaster', ('', 'import raycaster')),
+  ('human_detector', ('', 'import human_detector')),
+  ('maze_robot', ('import maze_sim; maze_sim.installStandIns()', 'import maze_robot')),
+  ('MazeSolver()', ('import maze_solver', 'maze_solver.MazeSolver()')),
+]
+
+PROBE = """
+import sys, time, json
+%s
+start = time.time()
+%s
+print(json.dumps({'seconds': time.time() - start, 'matplotlib': 'matplotlib' in sys.modules}))
+"""
+
+
+def measure(setup, statement, repeats=5):
+  """ run statement in fresh interpreters
+      returns the median seconds it took and whether matplotlib was loaded
+  """
+  directory = os.path.dirname(os.path.abspath(__file__))
+  seconds = []
+  for _ in range(repeats):
+    output = subprocess.check_output([sys.executable, '-c', PROBE % (setup, statement)], cwd=directory)
+    result = json.loads(output.decode().strip().splitlines()[-1])
+    seconds.append(result['seconds'])
+  return float(np.median(seconds)), result['matplotlib']
+
+
+if __name__ == '__main__':
+  import argparse
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('-r', '--repeats', type=int, default=5)
+  args = parser.parse_args()
+
+  for name, (setup, statement) in TARGETS:
+    seconds, matplotlib = measure(setup, statement, args.repeats)
+    print('%-16s %8.1f ms%s' % (name, 1000*seconds, '  matplotlib loaded' if matplotlib else ''))